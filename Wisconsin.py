@@ -12,16 +12,24 @@ tested in Python 3.11
 # ==============================
 # Imports
 # ==============================
-import pygame, sys, serial, zipfile, os
+import pygame, sys, serial, zipfile, os, json, math, hashlib, mmap, gc, ctypes, threading, queue, subprocess
+import numpy as np
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
 from random import shuffle, randint
+from itertools import product
 from pathlib import Path
+from collections import OrderedDict, namedtuple
 from datetime import datetime
 from tempfile import TemporaryDirectory
 
-from time import strftime, gmtime
+from time import strftime, gmtime, perf_counter_ns, thread_time_ns, sleep
 from pygame.locals import (
     FULLSCREEN,
+    SCALED,
     USEREVENT,
+    NOEVENT,
+    KEYDOWN,
     KEYUP,
     K_SPACE,
     K_RETURN,
@@ -54,16 +62,47 @@ DATA_DIR = BASE_DIR / "data"
 DEBUG_DIR = BASE_DIR / "debug_data"
 DEBUG_DIR.mkdir(exist_ok=True)
 
+# Cache directory for generated stimulus files (card atlas, decoded pixels)
+CACHE_DIR = BASE_DIR / "cache"
+PIXEL_CACHE_DIR = CACHE_DIR / "pixels"
+
 # Puerto de comunicación para triggers (ajustar según el sistema)
 serial_port = "COM5"  # Cambiar según el puerto de comunicación del sistema
+trigger_backend = "serial"  # "serial": EEG amplifier port, "null": discard, "recording": keep in memory, "pty": Linux pseudo-terminal pair for testing
+serial_write_timeout_s = 0.05  # A write blocked longer than this raises instead of stalling the trigger thread
+serial_low_latency = True  # Ask the driver for low-latency mode (Linux, ignored where pyserial does not support it)
+serial_drain_writes = False  # Wait after every trigger write until the byte has left the port
+trigger_calibration_writes = 200  # Writes timed by the latency calibration at init_com, 0 to skip it
+trigger_calibration_on_port = False  # Calibrate on the amplifier port itself (writes code 0 to it), otherwise on a pty loopback stand-in
 
 FullScreenShow = True  # Automatically start in fullscreen mode
 test_name = "Wisconsin Task"
 date_name = strftime("%Y-%m-%d_%H-%M-%S", gmtime())
 
+# Card rendering parameters
+card_source = "images" # "images": load the cards from media/images, "vector": generate and draw every card from its features
+card_width_ratio = 300 / 1920 # card width relative to the screen width (300 px on a 1920 px wide screen)
+card_height_ratio = 450 / 1080 # largest card height relative to the screen height (450 px on a 1080 px high screen), keeps both card rows on wide screens
+card_cache_budget_mb = 64 # memory budget of the pre-scaled card cache, least recently used cards are evicted beyond it
+display_update_mode = "dirty" # "dirty": push only changed rectangles, "flip": always flip the whole screen (always flip with vsync_enabled)
+vsync_enabled = True # If True, the display is opened with vsync so flip() returns at the vertical blank and onset triggers follow it
+card_atlas_enabled = True # If True, all cards are packed in one atlas image that is loaded instead of the separate files
+pixel_cache_enabled = True # If True, decoded and scaled cards are stored on disk and memory-mapped on later runs (takes precedence over the atlas)
+refresh_calibration_flips = 60 # flips timed at startup to measure the display refresh interval
+nominal_refresh_hz = 60 # refresh rate assumed when the flips are not synchronised to the display
+
+# Event waiting parameters
+event_wait_spin_ms = 2 # within this many ms of a known deadline the wait loops poll instead of blocking
+precise_delay_spin_ms = 2 # last stretch of every precise delay, busy-waited on perf_counter_ns instead of sleeping
+
+# Real-time execution parameters
+realtime_mode = False # If True, main() raises the render thread priority, pins it to one core and holds garbage collection during blocks
+realtime_cpu = None # core the render thread is pinned to in real-time mode (the trigger thread uses the others), None uses the last core
+
 # Trigger balancing parameters
 trigger_gap = 250 # total of triggers gap between sections
 individual_trigger_gap = 30 # gap between triggers within the same section, used to adjust timing of trigger sending
+trigger_burst_spacing_ms = individual_trigger_gap # spacing between the bytes of a trigger burst, 0 writes the whole burst at once (if the amplifier can separate them)
 
 # Triggers
 trigger_helper = {
@@ -123,8 +162,6 @@ trigger_helper = {
 # Global Variables
 
 series_tracking_counter = 0
-base_images_loaded = False
-base_images_list = []
 type_orders = ["number", "figure", "color"]
 
 translate_helper = {
@@ -158,6 +195,15 @@ PYTHON_VERSION = "3.11"
 # Timestamp used for file naming and session identification
 SESSION_TIMESTAMP = datetime.now().strftime("%Y%m%d_%H%M%S")
 
+# Session level measurements, written as JSON next to the data file
+session_metadata = {
+    "experiment_name": EXPERIMENT_NAME,
+    "experiment_version": EXPERIMENT_VERSION,
+    "python_version": PYTHON_VERSION,
+    "session_timestamp": SESSION_TIMESTAMP
+}
+session_metadata_path = None
+
 # ==============================
 # Deck Configuration
 # ==============================
@@ -221,15 +267,443 @@ single_cards_dir = BASE_DIR / "media" / "images" / "Single"
 double_cards_dir = BASE_DIR / "media" / "images" / "Double"
 static_cards_dir = BASE_DIR / "media" / "images" / "Static"
 
+# Reference cards (number, figure, color) of the generated card set, left to right
+vector_reference_cards = [
+    ("1", "triangle", "red"),
+    ("2", "star", "green"),
+    ("3", "cross", "yellow"),
+    ("4", "circle", "blue")
+]
+
+def generate_card_set():
+    """
+    Generates the card set from the reference card features instead of the image folders.
+    Each card is classified by how many different reference cards its features point to:
+    3 -> Single, 2 -> Double, 1 -> Static (a reference card itself).
+
+    Returns:
+        tuple: (singles, doubles, statics) lists of Path objects named
+        [number]_[figure]_[color].png, which do not exist on disk
+    """
+    feature_options = list(zip(*vector_reference_cards))  # numbers, figures, colors
+    card_folders = {3: single_cards_dir, 2: double_cards_dir, 1: static_cards_dir}
+    cards = {3: [], 2: [], 1: []}
+
+    for features in product(*feature_options):
+        matched_references = {options.index(value) for options, value in zip(feature_options, features)}
+        cards[len(matched_references)].append(card_folders[len(matched_references)] / ("_".join(features) + ".png"))
+
+    # Static cards keep the left to right order of the reference cards
+    statics = sorted(cards[1], key=lambda image_path: image_path.parts[-1])
+
+    if debug:
+        print(f"[DEBUG] Generated {len(cards[3])} singles, {len(cards[2])} doubles and {len(statics)} statics")
+
+    return cards[3], cards[2], statics
+
 # Load images
-single_images_list = load_images_from_folder(single_cards_dir)
-double_images_list = load_images_from_folder(double_cards_dir)
-static_images_list = load_images_from_folder(static_cards_dir)
+if card_source == "vector":
+    single_images_list, double_images_list, static_images_list = generate_card_set()
+else:
+    single_images_list = load_images_from_folder(single_cards_dir)
+    double_images_list = load_images_from_folder(double_cards_dir)
+    static_images_list = load_images_from_folder(static_cards_dir)
 
 # Shuffle only dynamic decks
 shuffle(single_images_list)
 shuffle(double_images_list)
 
+# ==============================
+# Card Feature Registry
+# ==============================
+
+# Integer codes of each feature value, features are stored in type_orders order
+feature_values = {
+    "number": ["1", "2", "3", "4"],
+    "figure": ["star", "triangle", "cross", "circle"],
+    "color": ["blue", "red", "green", "yellow"]
+}
+
+# index: position in card_records
+# features: (number, figure, color) integer codes, indexable with type_orders.index(rule)
+# triggers: (color, figure, number) trigger codes in sending order
+# name: file name without extension, as written in the data file
+CardRecord = namedtuple("CardRecord", ["index", "features", "triggers", "name", "path"])
+
+card_registry = {}  # Path -> CardRecord
+card_records = []   # index -> CardRecord
+
+def build_card_registry(image_paths):
+    """
+    Parses every card file name once and registers its features and triggers,
+    so the trial loop only does lookups.
+
+    Parameters:
+        image_paths (list): Path objects named [number]_[figure]_[color].ext
+    """
+    for image_path in image_paths:
+        if image_path in card_registry:
+            continue
+
+        name = image_path.parts[-1].split('.')[0]
+        parts = [translate_helper.get(part, part) for part in name.split('_')]
+
+        if len(parts) != 3:
+            raise ValueError(f"Invalid card file name: {image_path.parts[-1]}")
+
+        number, figure, color = parts
+        try:
+            features = tuple(feature_values[feature_type].index(value)
+                             for feature_type, value in zip(type_orders, parts))
+        except ValueError:
+            raise ValueError(f"Invalid card features in file name: {image_path.parts[-1]}")
+
+        record = CardRecord(
+            index=len(card_records),
+            features=features,
+            triggers=(trigger_helper[f"{color}_card"],
+                      trigger_helper[f"{figure}_card"],
+                      trigger_helper[f"number_{number}_card"]),
+            name=name,
+            path=image_path
+        )
+        card_registry[image_path] = record
+        card_records.append(record)
+
+    if debug:
+        print(f"[DEBUG] Card registry: {len(card_records)} cards")
+
+build_card_registry(single_images_list + double_images_list + static_images_list)
+
+# ==============================
+# Response Scoring
+# ==============================
+
+def build_correctness_matrix():
+    """
+    Precomputes whether each reference key is correct for every card and rule.
+
+    Returns:
+        np.ndarray: bool array indexed by (card index, reference key, rule index),
+        rule index following type_orders
+    """
+    features = np.array([record.features for record in card_records], dtype=np.int8)
+    reference_features = features[[card_registry[image].index for image in static_images_list]]
+
+    return features[:, np.newaxis, :] == reference_features[np.newaxis, :, :]
+
+def export_correctness_matrix(file_path):
+    """
+    Saves the correctness matrix with its axis labels, so sessions can be
+    rescored from the data file (IdImagen, Respuesta, TipoSerie) without parsing file names.
+    """
+    np.savez(file_path,
+             matrix=correctness_matrix,
+             card_names=np.array([record.name for record in card_records]),
+             reference_names=np.array([card_registry[image].name for image in static_images_list]),
+             rules=np.array(type_orders))
+
+    if debug:
+        print(f"[DEBUG] Correctness matrix {correctness_matrix.shape} exported to {file_path}")
+
+correctness_matrix = build_correctness_matrix()
+
+# ==============================
+# Card Atlas
+# ==============================
+
+CARD_ATLAS_PATH = CACHE_DIR / "card_atlas.png"
+CARD_ATLAS_INDEX_PATH = CACHE_DIR / "card_atlas.json"
+
+def card_atlas_key(image_path):
+    """Atlas index key of a card: its path relative to media/images."""
+    return image_path.relative_to(BASE_DIR / "media" / "images").as_posix()
+
+def card_source_signature(image_paths):
+    """Size and modification time of every card file, used to detect a stale atlas."""
+    return {card_atlas_key(image_path): [image_path.stat().st_size, image_path.stat().st_mtime_ns]
+            for image_path in image_paths}
+
+def build_card_atlas(image_paths):
+    """
+    Packs all cards into one image (shelf packing, tallest cards first) and
+    writes the coordinate index next to it.
+
+    Parameters:
+        image_paths (list): Path objects of the cards to pack
+    """
+    pictures = [(image_path, pygame.image.load(image_path)) for image_path in image_paths]
+    pictures.sort(key=lambda item: item[1].get_height(), reverse=True)
+
+    total_area = sum(picture.get_width() * picture.get_height() for _, picture in pictures)
+    atlas_width = max(math.ceil(math.sqrt(total_area)), max(picture.get_width() for _, picture in pictures))
+
+    cards = {}
+    x = y = shelf_height = 0
+    for image_path, picture in pictures:
+        width, height = picture.get_size()
+        if x + width > atlas_width:
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+        cards[card_atlas_key(image_path)] = {"rect": [x, y, width, height],
+                                             "alpha": picture.get_alpha() is not None}
+        x += width
+        shelf_height = max(shelf_height, height)
+
+    atlas = pygame.Surface((atlas_width, y + shelf_height), pygame.SRCALPHA)
+    for image_path, picture in pictures:
+        atlas.blit(picture, cards[card_atlas_key(image_path)]["rect"][:2])
+
+    CACHE_DIR.mkdir(exist_ok=True)
+    pygame.image.save(atlas, str(CARD_ATLAS_PATH))
+    with open(CARD_ATLAS_INDEX_PATH, "w", encoding="utf-8") as f:
+        json.dump({"sources": card_source_signature(image_paths), "cards": cards}, f, indent=4)
+
+    if debug:
+        print(f"[DEBUG] Card atlas built: {len(cards)} cards in {atlas.get_size()} at {CARD_ATLAS_PATH}")
+
+def load_card_atlas(image_paths):
+    """
+    Loads the card atlas as a single file, rebuilding it when cards were added
+    or modified. Requires the display to be initialized.
+
+    Returns:
+        dict: Path -> (subsurface view of the card, has_alpha)
+    """
+    index = None
+    if CARD_ATLAS_PATH.exists() and CARD_ATLAS_INDEX_PATH.exists():
+        with open(CARD_ATLAS_INDEX_PATH, encoding="utf-8") as f:
+            index = json.load(f)
+
+    if index is None or index["sources"] != card_source_signature(image_paths):
+        build_card_atlas(image_paths)
+        with open(CARD_ATLAS_INDEX_PATH, encoding="utf-8") as f:
+            index = json.load(f)
+
+    atlas = pygame.image.load(str(CARD_ATLAS_PATH)).convert_alpha()
+
+    return {image_path: (atlas.subsurface(index["cards"][card_atlas_key(image_path)]["rect"]),
+                         index["cards"][card_atlas_key(image_path)]["alpha"])
+            for image_path in image_paths}
+
+# ==============================
+# Decoded Pixel Cache
+# ==============================
+
+PIXEL_CACHE_INDEX_PATH = PIXEL_CACHE_DIR / "index.json"
+pixel_cache_maps = []  # open memory maps backing the cached card surfaces
+
+def pixel_cache_key(image_path, size):
+    """Cache key of a card at a given size, derived from the file content."""
+    with open(image_path, "rb") as f:
+        file_hash = hashlib.sha1(f.read()).hexdigest()
+    return f"{file_hash}_{size[0]}x{size[1]}"
+
+def decode_card_pixels(image_path, size, cache_path):
+    """
+    Decodes and scales one card and writes its raw BGRA pixels to cache_path.
+    Runs in a worker process.
+
+    Returns:
+        tuple: (size, has_alpha) of the written buffer
+    """
+    picture = pygame.transform.scale(pygame.image.load(image_path), size)
+
+    temp_path = cache_path.with_suffix(".tmp")
+    with open(temp_path, "wb") as f:
+        f.write(pygame.image.tostring(picture, "BGRA"))
+    os.replace(temp_path, cache_path)
+
+    return picture.get_size(), picture.get_alpha() is not None
+
+def load_pixel_cache(image_paths, size):
+    """
+    Memory-maps the decoded pixels of every card at the given size. Missing
+    entries are decoded first in parallel with a process pool.
+
+    Returns:
+        dict: Path -> (surface wrapping the mapped buffer, has_alpha)
+    """
+    PIXEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    index = {}
+    if PIXEL_CACHE_INDEX_PATH.exists():
+        with open(PIXEL_CACHE_INDEX_PATH, encoding="utf-8") as f:
+            index = json.load(f)
+
+    keys = {image_path: pixel_cache_key(image_path, size) for image_path in image_paths}
+    missing = [image_path for image_path, key in keys.items()
+               if key not in index or not (PIXEL_CACHE_DIR / f"{key}.bgra").exists()]
+
+    if missing:
+        with ProcessPoolExecutor() as executor:
+            futures = {image_path: executor.submit(decode_card_pixels, image_path, size,
+                                                   PIXEL_CACHE_DIR / f"{keys[image_path]}.bgra")
+                       for image_path in missing}
+            for image_path, future in futures.items():
+                decoded_size, has_alpha = future.result()
+                index[keys[image_path]] = {"size": list(decoded_size), "alpha": has_alpha}
+
+        with open(PIXEL_CACHE_INDEX_PATH, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=4)
+
+        if debug:
+            print(f"[DEBUG] Pixel cache: decoded {len(missing)} cards at size {size}")
+
+    sources = {}
+    for image_path, key in keys.items():
+        with open(PIXEL_CACHE_DIR / f"{key}.bgra", "rb") as f:
+            pixels = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        pixel_cache_maps.append(pixels)
+        sources[image_path] = (pygame.image.frombuffer(pixels, index[key]["size"], "BGRA"),
+                               index[key]["alpha"])
+
+    return sources
+
+# ==============================
+# Vector Card Renderer
+# ==============================
+
+vector_card_ratio = 1.5 # height / width of the generated cards
+
+# Display colors of each card color feature
+vector_colors = {
+    "blue": (30, 80, 220),
+    "red": (220, 30, 30),
+    "green": (20, 160, 50),
+    "yellow": (240, 200, 0)
+}
+
+# Figure centers inside the card (fractions of the card size) by number of figures
+vector_figure_positions = {
+    1: [(0.5, 0.5)],
+    2: [(0.5, 0.33), (0.5, 0.67)],
+    3: [(0.5, 0.22), (0.5, 0.5), (0.5, 0.78)],
+    4: [(0.3, 0.33), (0.7, 0.33), (0.3, 0.67), (0.7, 0.67)]
+}
+
+def draw_figure(surface, figure, color, center, radius):
+    """Draws one card figure (star, triangle, cross or circle) with pygame primitives."""
+    x, y = center
+
+    if figure == "circle":
+        pygame.draw.circle(surface, color, center, radius)
+    elif figure == "triangle":
+        pygame.draw.polygon(surface, color, [
+            (x, y - radius),
+            (x - radius * math.sqrt(3) / 2, y + radius / 2),
+            (x + radius * math.sqrt(3) / 2, y + radius / 2)
+        ])
+    elif figure == "star":
+        points = []
+        for count in range(10):
+            angle = math.radians(-90 + count * 36)
+            point_radius = radius if count % 2 == 0 else radius * 0.45
+            points.append((x + point_radius * math.cos(angle), y + point_radius * math.sin(angle)))
+        pygame.draw.polygon(surface, color, points)
+    elif figure == "cross":
+        arm = radius * 0.35
+        pygame.draw.rect(surface, color, pygame.Rect(x - radius, y - arm, 2 * radius, 2 * arm))
+        pygame.draw.rect(surface, color, pygame.Rect(x - arm, y - radius, 2 * arm, 2 * radius))
+    else:
+        raise ValueError(f"Unknown card figure: {figure}")
+
+def render_vector_card(card, size):
+    """
+    Draws a card from its features at the given size.
+
+    Parameters:
+        card (CardRecord): Registered card
+        size (tuple): Card size in pixels
+
+    Returns:
+        pygame.Surface: The rendered card in display format
+    """
+    number, figure, color = (feature_values[feature_type][code]
+                             for feature_type, code in zip(type_orders, card.features))
+    width, height = size
+
+    surface = pygame.Surface(size).convert()
+    surface.fill(background)
+    pygame.draw.rect(surface, (255, 255, 255), surface.get_rect(), border_radius=width // 12)
+    pygame.draw.rect(surface, (80, 80, 80), surface.get_rect(), max(1, width // 100), border_radius=width // 12)
+
+    for x, y in vector_figure_positions[int(number)]:
+        draw_figure(surface, figure, vector_colors[color], (int(width * x), int(height * y)), int(width * 0.16))
+
+    return surface
+
+# ==============================
+# Card Surface Cache
+# ==============================
+
+class CardSurfaceCache:
+    """
+    LRU cache of display-format card surfaces, pre-scaled to the on-screen size.
+    Every card is loaded once at init() so trials never read the disk or rescale.
+    """
+    def __init__(self, budget_mb=card_cache_budget_mb):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.surfaces = OrderedDict()
+        self.used_bytes = 0
+        self.size = None
+        self.sources = {}
+        self.misses = 0
+
+    def preload(self, image_paths, size, sources=None):
+        """
+        Loads, converts and scales all given cards.
+
+        Parameters:
+            image_paths (list): Path objects of the cards to cache
+            size (tuple): On-screen card size in pixels
+            sources (dict): Optional Path -> (surface, has_alpha) already in memory
+                            (e.g. atlas views), used instead of reading the files
+        """
+        self.size = tuple(size)
+        self.sources = sources if sources is not None else {}
+        for image_path in image_paths:
+            self._insert(image_path, self._load(image_path))
+
+        if debug:
+            print(f"[DEBUG] Card cache: {len(self.surfaces)} surfaces, "
+                  f"{self.used_bytes / (1024 * 1024):.1f} MB of {self.budget_bytes / (1024 * 1024):.1f} MB")
+            if len(self.surfaces) < len(image_paths):
+                print("[DEBUG] Warning: card cache budget too small, some cards will be reloaded from disk")
+
+    def get(self, image_path):
+        """Returns the cached surface of a card, reloading it only if it was evicted."""
+        surface = self.surfaces.get(image_path)
+        if surface is None:
+            self.misses += 1
+            print(f"[DEBUG] Card cache miss: {image_path}") if debug else None
+            surface = self._load(image_path)
+            self._insert(image_path, surface)
+        else:
+            self.surfaces.move_to_end(image_path)
+        return surface
+
+    def _load(self, image_path):
+        if image_path in self.sources:
+            picture, has_alpha = self.sources[image_path]
+        else:
+            picture = pygame.image.load(image_path)
+            has_alpha = picture.get_alpha() is not None
+        if picture.get_size() != self.size:
+            picture = pygame.transform.scale(picture, self.size)
+        return picture.convert_alpha() if has_alpha else picture.convert()
+
+    def _insert(self, image_path, surface):
+        surface_bytes = surface.get_bytesize() * surface.get_width() * surface.get_height()
+        self.surfaces[image_path] = surface
+        self.used_bytes += surface_bytes
+
+        # Evict the least recently used cards, never the one just inserted
+        while self.used_bytes > self.budget_bytes and len(self.surfaces) > 1:
+            _, evicted = self.surfaces.popitem(last=False)
+            self.used_bytes -= evicted.get_bytesize() * evicted.get_width() * evicted.get_height()
+
 # ==============================
 # Deck Control
 # ==============================
@@ -327,89 +801,681 @@ def build_deck_plan(series_sizes, deck_sizes):
 
     return deck_plan
 
+# ==============================
+# Timing
+# ==============================
+
+delay_overshoots_ns = []  # overshoot of every precise delay of the session
+
+def wait_until_ns(target_ns, yield_gil=False, record=True):
+    """
+    Sleeps coarsely until precise_delay_spin_ms before target_ns and busy-waits
+    the rest on perf_counter_ns.
+
+    Parameters:
+        yield_gil (bool): release the GIL on every pass of the busy-wait, for waits
+                          off the main thread so they do not hold up rendering
+        record (bool): add the overshoot to delay_overshoots_ns, False for waits
+                       outside the experiment (calibrations, benchmarks, polling)
+
+    Returns:
+        int: perf_counter_ns time at which the wait ended
+    """
+    remaining_ns = target_ns - perf_counter_ns()
+    if remaining_ns < 0:
+        return target_ns - remaining_ns  # already past, nothing to wait for
+
+    if remaining_ns > precise_delay_spin_ms * 1_000_000:
+        sleep((remaining_ns - precise_delay_spin_ms * 1_000_000) / 1e9)
+
+    now_ns = perf_counter_ns()
+    while now_ns < target_ns:
+        if yield_gil:
+            sleep(0)
+        now_ns = perf_counter_ns()
+
+    if record:
+        delay_overshoots_ns.append(now_ns - target_ns)
+    return now_ns
+
+def precise_delay(delay_ms):
+    """Waits delay_ms milliseconds (fractions allowed) with sub-millisecond accuracy."""
+    return wait_until_ns(perf_counter_ns() + int(delay_ms * 1_000_000))
+
+def delay_overshoot_summary():
+    """Returns the overshoot distribution of the precise delays in microseconds."""
+    if not delay_overshoots_ns:
+        return {"delays": 0}
+
+    overshoots_us = np.array(delay_overshoots_ns) / 1e3
+    return {
+        "delays": len(overshoots_us),
+        "mean_us": round(float(overshoots_us.mean()), 2),
+        "p50_us": round(float(np.percentile(overshoots_us, 50)), 2),
+        "p95_us": round(float(np.percentile(overshoots_us, 95)), 2),
+        "p99_us": round(float(np.percentile(overshoots_us, 99)), 2),
+        "max_us": round(float(overshoots_us.max()), 2)
+    }
+
+# ==============================
+# Real-Time Execution
+# ==============================
+
+gc_pauses = []  # (start perf_counter_ns, duration ns, generation) of every garbage collection
+gc_pause_start_ns = None
+
+def record_gc_pause(phase, info):
+    """gc.callbacks hook, times every garbage collection."""
+    global gc_pause_start_ns
+    if phase == "start":
+        gc_pause_start_ns = perf_counter_ns()
+    elif gc_pause_start_ns is not None:
+        gc_pauses.append((gc_pause_start_ns, perf_counter_ns() - gc_pause_start_ns, info["generation"]))
+        gc_pause_start_ns = None
+
+def gc_pause_summary(start_ns, end_ns):
+    """Returns the count and duration of the garbage collections between start_ns and end_ns."""
+    durations_ms = [duration_ns / 1e6 for pause_ns, duration_ns, _ in gc_pauses if start_ns <= pause_ns < end_ns]
+    return {
+        "collections": len(durations_ms),
+        "total_ms": round(sum(durations_ms), 3),
+        "max_ms": round(max(durations_ms), 3) if durations_ms else 0
+    }
+
+def enter_realtime_mode(cpu=None, other_threads=()):
+    """
+    Raises the priority of the calling (render) thread (SCHED_FIFO, or nice if not
+    permitted, on posix; HIGH_PRIORITY_CLASS for the process on Windows) and pins
+    it to one core. The other threads are moved to the remaining cores, so their
+    busy-waits never compete with the render thread. Threads and processes created
+    afterwards inherit the calling thread's settings, so call it once they exist.
+
+    Parameters:
+        cpu (int): Core to pin the render thread to, None for the last core
+        other_threads (list[threading.Thread]): Running threads kept off that core
+
+    Returns:
+        dict: priority and cores actually applied (None where the OS refused)
+    """
+    cpu = os.cpu_count() - 1 if cpu is None else cpu
+    other_cpus = set(range(os.cpu_count())) - {cpu} or {cpu}  # single core machines share it
+    applied = {"priority": None, "cpu": None, "other_threads_cpus": None}
+
+    if os.name == "nt":
+        kernel32 = ctypes.windll.kernel32
+        if kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), 0x00000080):  # HIGH_PRIORITY_CLASS
+            applied["priority"] = "HIGH_PRIORITY_CLASS"
+        if kernel32.SetThreadAffinityMask(kernel32.GetCurrentThread(), 1 << cpu):
+            applied["cpu"] = cpu
+
+        other_mask = sum(1 << other_cpu for other_cpu in other_cpus)
+        moved = True
+        for thread in other_threads:
+            handle = kernel32.OpenThread(0x0060, False, thread.native_id)  # THREAD_SET_INFORMATION | THREAD_QUERY_INFORMATION
+            moved = bool(handle) and bool(kernel32.SetThreadAffinityMask(handle, other_mask)) and moved
+            if handle:
+                kernel32.CloseHandle(handle)
+        if other_threads and moved:
+            applied["other_threads_cpus"] = sorted(other_cpus)
+    else:
+        # On Linux pid 0 is the calling thread, already running threads keep their own policy and mask
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(os.sched_get_priority_min(os.SCHED_FIFO)))
+            applied["priority"] = "SCHED_FIFO"
+        except (AttributeError, OSError):
+            try:
+                os.nice(-10)
+                applied["priority"] = "nice -10"
+            except OSError:
+                pass
+
+        try:
+            os.sched_setaffinity(0, {cpu})
+            applied["cpu"] = cpu
+            for thread in other_threads:
+                os.sched_setaffinity(thread.native_id, other_cpus)
+            if other_threads:
+                applied["other_threads_cpus"] = sorted(other_cpus)
+        except (AttributeError, OSError):
+            pass
+
+    print(f"[DEBUG] Real-time mode: {applied}") if debug else None
+    return applied
+
+def hold_gc():
+    """Moves every live object out of the collector's reach and disables collection for a block."""
+    gc.freeze()
+    gc.disable()
+
+def release_gc():
+    """Enables collection again and collects what the block left behind (called at break screens)."""
+    gc.unfreeze()
+    gc.enable()
+    gc.collect()
+
 # ==============================
 # EEG / Trigger Functions
 # ==============================
 
+class TriggerBackend(ABC):
+    """Output the trigger codes are written to, every backend implements write()."""
+    name = "base"
+
+    @abstractmethod
+    def write(self, data):
+        """Writes the trigger bytes."""
+
+    def drain(self):
+        """Waits until the written bytes have left the backend."""
+        pass
+
+    def close(self):
+        pass
+
+class SerialTriggerBackend(TriggerBackend):
+    """Serial port of the EEG amplifier."""
+    name = "serial"
+
+    def __init__(self, address, baudrate=115200, write_timeout=None, low_latency=False, drain_writes=False):
+        self.port = serial.Serial()
+        self.port.port = address
+        self.port.baudrate = baudrate
+        self.port.write_timeout = write_timeout
+        self.port.open()
+
+        # pyserial's flush() sleeps in 50 ms steps on Windows, so the drain is done here:
+        # tcdrain on posix, elsewhere the output queue is polled with wait_until_ns
+        self.drain_method = "tcdrain" if os.name == 'posix' else "out_waiting"
+        if drain_writes and self.drain_method != "tcdrain":
+            print('Draining every trigger write is only supported on posix, serial_drain_writes ignored')
+            drain_writes = False
+        self.drain_writes = drain_writes
+
+        self.low_latency = False
+        if low_latency:
+            try:
+                self.port.set_low_latency_mode(True)  # only on posix, and only if the driver allows it
+                self.low_latency = True
+            except (AttributeError, NotImplementedError, ValueError, OSError):
+                print('Low-latency mode not supported by this serial port')
+
+    def write(self, data):
+        self.port.write(data)
+        if self.drain_writes:
+            self.drain()
+
+    def drain(self):
+        if self.drain_method == "tcdrain":
+            import termios  # posix only
+
+            termios.tcdrain(self.port.fd)  # returns once the output buffer is transmitted
+        else:
+            deadline_ns = perf_counter_ns() + int((self.port.write_timeout or 1) * 1e9)
+            while self.port.out_waiting and perf_counter_ns() < deadline_ns:
+                wait_until_ns(perf_counter_ns() + 100_000, record=False)
+
+    def close(self):
+        self.port.close()
+
+class NullTriggerBackend(TriggerBackend):
+    """Discards every trigger, used when no port is available."""
+    name = "null"
+
+    def write(self, data):
+        pass
+
+class RecordingTriggerBackend(TriggerBackend):
+    """Keeps every write in memory as (perf_counter_ns, bytes)."""
+    name = "recording"
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, data):
+        self.records.append((perf_counter_ns(), bytes(data)))
+
+class PtyTriggerBackend(TriggerBackend):
+    """
+    Linux pseudo-terminal pair standing in for the amplifier port: codes written
+    to the master end can be read and timestamped from slave_path by another process.
+    """
+    name = "pty"
+
+    def __init__(self):
+        import tty  # posix only
+
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)  # no line buffering or echo, every byte is readable at once
+        self.slave_path = os.ttyname(self.slave_fd)
+
+    def write(self, data):
+        os.write(self.master_fd, data)
+
+    def close(self):
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+def open_trigger_backend(kind, address=None):
+    """
+    Opens the trigger backend of the given kind. If the serial port cannot be
+    opened, the null backend is used so the experiment can still run.
+    """
+    if kind == "serial":
+        try:
+            backend = SerialTriggerBackend(address, write_timeout=serial_write_timeout_s,
+                                           low_latency=serial_low_latency, drain_writes=serial_drain_writes)
+            print('Serial port opened')
+            return backend
+        except Exception:
+            print('Serial port could not be opened, triggers will be discarded')
+            return NullTriggerBackend()
+    elif kind == "pty":
+        backend = PtyTriggerBackend()
+        print(f'Trigger pty opened, read it from {backend.slave_path}')
+        return backend
+    elif kind == "recording":
+        return RecordingTriggerBackend()
+    return NullTriggerBackend()
+
+trigger_output = NullTriggerBackend()  # opened by init_com
+
 def init_com(address="COM3"):
-    """Initializes a serial port connection."""
-    global ser
-    try:
-        ser = serial.Serial()
-        ser.port = address
-        ser.baudrate = 115200
-        ser.open()
-        print('Serial port opened')
-    except Exception:
-        print('Serial port could not be opened')
+    """Opens the trigger backend and starts the trigger dispatcher."""
+    global trigger_output, trigger_dispatcher
+    trigger_dispatcher = TriggerDispatcher()
+    trigger_dispatcher.start()
+    trigger_output = open_trigger_backend(trigger_backend, address)
+    session_metadata["trigger_backend"] = trigger_output.name
+    if trigger_calibration_writes:
+        session_metadata["trigger_calibration"] = calibrate_trigger_output(trigger_calibration_writes)
 
 def send_trigger(trigger):
-    """Sends a trigger via serial port."""
+    """
+    Sends a trigger through the trigger backend.
+
+    Returns:
+        int: perf_counter_ns time right after the write returned, None if it failed
+    """
     try:
-        ser.write((trigger).to_bytes(1, 'little'))
+        trigger_output.write((trigger).to_bytes(1, 'little'))
+        sent_ns = perf_counter_ns()
         print(f'Trigger {trigger} sent')
+        return sent_ns
     except Exception:
         print(f'Failed to send trigger {trigger}')
 
+def send_trigger_sequence(codes, spacing_ms=0, start_ns=None, yield_gil=False):
+    """
+    Sends a burst of trigger codes through the trigger backend. Without spacing
+    the whole burst is a single write, otherwise code i is written at
+    start_ns + i * spacing_ms, so the spacing does not drift along the burst.
+
+    Parameters:
+        codes (bytes): Trigger codes in sending order
+        spacing_ms (float): Time between codes
+        start_ns (int): perf_counter_ns time of the first code, now if None
+        yield_gil (bool): passed to wait_until_ns while waiting between codes
+
+    Returns:
+        list[tuple]: (code, planned perf_counter_ns, perf_counter_ns after the write or None if it failed)
+    """
+    start_ns = perf_counter_ns() if start_ns is None else start_ns
+    spacing_ns = int(spacing_ms * 1_000_000)
+    sends = []
+
+    try:
+        if spacing_ns == 0:
+            wait_until_ns(start_ns, yield_gil)
+            trigger_output.write(bytes(codes))
+            sent_ns = perf_counter_ns()
+            sends = [(code, start_ns, sent_ns) for code in codes]
+        else:
+            for i, code in enumerate(codes):
+                planned_ns = start_ns + i * spacing_ns
+                wait_until_ns(planned_ns, yield_gil)
+                trigger_output.write(bytes((code,)))
+                sends.append((code, planned_ns, perf_counter_ns()))
+        print(f'Triggers {list(codes)} sent')
+    except Exception:
+        print(f'Failed to send triggers {list(codes)}')
+        sends += [(code, start_ns + i * spacing_ns, None) for i, code in enumerate(codes) if i >= len(sends)]
+
+    return sends
+
 def sleepy_trigger(trigger, latency=100):
+    """Queues a trigger on the dispatcher, nothing else is sent until latency ms after it."""
     if debug:
         print(f"[DEBUG] Creating trigger {trigger} with latency {latency} ms")
-    send_trigger(trigger)
-    pygame.time.delay(latency)
+    trigger_dispatcher.post(trigger, spacing_ms=latency)
+
+class TriggerDispatcher(threading.Thread):
+    """
+    Sends the triggers from its own thread, so the main loop only queues them and
+    continues. Queued items (codes, earliest_send_ns, spacing_ns) are sent in order,
+    each at its earliest time but never before the spacing of the previous one
+    has elapsed; the codes of an item go out as one burst spaced by spacing_ns.
+    Every send is written to log_file with its planned and actual time.
+    """
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.next_send_ns = 0  # earliest time the spacing of the last trigger allows another one
+        self.block = None
+        self.block_start_ns = perf_counter_ns()
+        self.log_file = None
+        self.sends = 0
+        self.max_late_ns = 0
+        self.burst_interval_errors_ns = []  # achieved minus planned interval between the codes of a burst
+
+    def start_block(self, block, block_start_ns):
+        """Times of the following sends are logged in ms from block_start_ns."""
+        self.block = block
+        self.block_start_ns = block_start_ns
+
+    def post(self, code, earliest_send_ns=None, spacing_ms=individual_trigger_gap):
+        """Queues a trigger, to be sent at earliest_send_ns (as soon as possible if None)."""
+        self.post_sequence((code,), spacing_ms, earliest_send_ns)
+
+    def post_sequence(self, codes, spacing_ms=trigger_burst_spacing_ms, earliest_send_ns=None):
+        """Queues a burst of triggers spaced by spacing_ms (one write if 0), nothing follows it before spacing_ms."""
+        earliest_send_ns = perf_counter_ns() if earliest_send_ns is None else earliest_send_ns
+        self.queue.put((bytes(codes), earliest_send_ns, int(spacing_ms * 1_000_000)))
+
+    def send_now(self, code, spacing_ms=individual_trigger_gap):
+        """
+        Sends a trigger right away from the calling thread, for markers locked to a
+        flip or a response. Only called while the queue is idle (after wait_idle).
+
+        Returns:
+            int: perf_counter_ns time right after the write returned, None if it failed
+        """
+        with self.lock:
+            planned_ns = perf_counter_ns()
+            sent_ns = send_trigger(code)
+            self._record(code, planned_ns, sent_ns, int(spacing_ms * 1_000_000))
+        return sent_ns
+
+    def wait_idle(self):
+        """Waits until every queued trigger is sent and the spacing of the last one has elapsed."""
+        self.queue.join()
+        wait_until_ns(self.next_send_ns)
+
+    def stop(self):
+        """Sends what is still queued and ends the thread."""
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+
+            codes, earliest_send_ns, spacing_ns = item
+            with self.lock:
+                sends = send_trigger_sequence(codes, spacing_ns / 1e6, max(earliest_send_ns, self.next_send_ns), yield_gil=True)
+                for code, planned_ns, sent_ns in sends:
+                    self._record(code, planned_ns, sent_ns, spacing_ns)
+
+            sent_times = [sent_ns for _, _, sent_ns in sends]
+            if len(sends) > 1 and None not in sent_times:
+                self.burst_interval_errors_ns += [later - earlier - spacing_ns for earlier, later in zip(sent_times, sent_times[1:])]
+            self.queue.task_done()
+
+    def _record(self, code, planned_ns, sent_ns, spacing_ns):
+        done_ns = sent_ns if sent_ns is not None else perf_counter_ns()
+        self.next_send_ns = done_ns + spacing_ns
+        self.sends += 1
+        self.max_late_ns = max(self.max_late_ns, done_ns - planned_ns)
+
+        if self.log_file is not None:
+            # ("Bloque", "Codigo", "EnvioPlanificado", "Envio", "Desfase")
+            self.log_file.write("%s,%s,%.3f,%s,%s\n" % (self.block if self.block is not None else "",
+                                                       code,
+                                                       (planned_ns - self.block_start_ns) / 1e6,
+                                                       f"{(sent_ns - self.block_start_ns) / 1e6:.3f}" if sent_ns is not None else "",
+                                                       f"{(sent_ns - planned_ns) / 1e6:.3f}" if sent_ns is not None else ""))
+            if threading.current_thread() is self:
+                self.log_file.flush()
+
+    def summary(self):
+        """Returns the number of sends, the worst delay behind the planned send time and the burst interval errors."""
+        summary = {"sends": self.sends, "max_late_ms": round(self.max_late_ns / 1e6, 3)}
+        if self.burst_interval_errors_ns:
+            errors_ms = np.abs(self.burst_interval_errors_ns) / 1e6
+            summary["burst_intervals"] = len(errors_ms)
+            summary["burst_interval_error_p50_ms"] = round(float(np.percentile(errors_ms, 50)), 3)
+            summary["burst_interval_error_max_ms"] = round(float(errors_ms.max()), 3)
+        return summary
+
+trigger_dispatcher = None  # started by init_com
 
 def close_com():
-    """Closes the serial port."""
+    """Sends the queued triggers and closes the trigger backend."""
+    if trigger_dispatcher is not None:
+        trigger_dispatcher.stop()
     try:
-        ser.close()
+        trigger_output.close()
         print('Serial port closed')
     except Exception:
         print('Serial port could not be closed')
 
+# Reads count bytes from a pty slave and prints the perf_counter_ns time each one arrived
+PTY_READER_SCRIPT = """
+import os, sys
+from time import perf_counter_ns
+fd = os.open(sys.argv[1], os.O_RDONLY | os.O_NOCTTY)
+count = int(sys.argv[2])
+read_ns = []
+print("ready", flush=True)
+while len(read_ns) < count:
+    data = os.read(fd, count)
+    read_ns.extend([perf_counter_ns()] * len(data))
+print(" ".join(map(str, read_ns)), flush=True)
+"""
+
+def benchmark_trigger_backend(backend, count=1000, spacing_ms=1):
+    """
+    Measures the write latency and throughput of a trigger backend. With the pty
+    backend the slave end is read by a separate process, which gives the
+    write-to-read latency an external reader would see (perf_counter is
+    system-wide on Linux). The writer yields while spacing the writes, so its
+    busy-wait does not hold the reader off a shared core.
+
+    Parameters:
+        backend (TriggerBackend): Backend to measure
+        count (int): Number of single-byte writes
+        spacing_ms (float): Time between writes, 0 to write back to back
+
+    Returns:
+        dict: percentiles in microseconds and writes per second
+    """
+    written_ns = []
+    read_ns = []
+
+    reader = None
+    if isinstance(backend, PtyTriggerBackend):
+        reader = subprocess.Popen([sys.executable, "-c", PTY_READER_SCRIPT, backend.slave_path, str(count)],
+                                  stdout=subprocess.PIPE, text=True)
+        reader.stdout.readline()  # "ready", the slave is open before the first write
+
+    write_us = []
+    start_ns = perf_counter_ns()
+    for i in range(count):
+        write_start_ns = perf_counter_ns()
+        backend.write((i % 256).to_bytes(1, 'little'))
+        write_us.append((perf_counter_ns() - write_start_ns) / 1e3)
+        written_ns.append(write_start_ns)
+        if spacing_ms:
+            wait_until_ns(write_start_ns + int(spacing_ms * 1_000_000), yield_gil=True, record=False)
+    elapsed_s = (perf_counter_ns() - start_ns) / 1e9
+
+    results = {
+        "backend": backend.name,
+        "writes": count,
+        "writes_per_s": round(count / elapsed_s, 1),
+        "write_p50_us": round(float(np.percentile(write_us, 50)), 2),
+        "write_p99_us": round(float(np.percentile(write_us, 99)), 2),
+        "write_max_us": round(max(write_us), 2)
+    }
+
+    if reader is not None:
+        try:
+            read_ns = [int(value) for value in reader.communicate(timeout=5)[0].split()]
+        except subprocess.TimeoutExpired:
+            reader.kill()  # fewer bytes arrived than were written
+            reader.communicate()
+        latency_us = (np.array(read_ns[:count]) - np.array(written_ns[:len(read_ns)])) / 1e3
+        results.update({
+            "read_p50_us": round(float(np.percentile(latency_us, 50)), 2),
+            "read_p99_us": round(float(np.percentile(latency_us, 99)), 2),
+            "read_max_us": round(float(latency_us.max()), 2)
+        })
+
+    return results
+
+def calibrate_trigger_latency(backend, count=200, spacing_ms=1):
+    """
+    Times how long a trigger write takes to return and how long until the byte
+    has left the backend: the serial drain (tcdrain, or the driver's output queue
+    emptying where tcdrain is not available), or for the pty loopback the moment
+    the byte can be read from the slave end. Writes code 0, which does not mark
+    anything on the amplifier.
+
+    Parameters:
+        backend (TriggerBackend): Backend to calibrate
+        count (int): Number of single-byte writes
+        spacing_ms (float): Time between writes
+
+    Returns:
+        dict: write-return and drain percentiles in microseconds
+    """
+    write_us = []
+    drain_us = []
+    for _ in range(count):
+        start_ns = perf_counter_ns()
+        backend.write(b'\x00')
+        written_ns = perf_counter_ns()
+        if isinstance(backend, PtyTriggerBackend):
+            os.read(backend.slave_fd, 1)
+        else:
+            backend.drain()
+        drained_ns = perf_counter_ns()
+        write_us.append((written_ns - start_ns) / 1e3)
+        drain_us.append((drained_ns - start_ns) / 1e3)
+        wait_until_ns(start_ns + int(spacing_ms * 1_000_000), record=False)
+
+    return {
+        "backend": backend.name,
+        "writes": count,
+        "write_p50_us": round(float(np.percentile(write_us, 50)), 2),
+        "write_p99_us": round(float(np.percentile(write_us, 99)), 2),
+        "write_max_us": round(max(write_us), 2),
+        "drain_p50_us": round(float(np.percentile(drain_us, 50)), 2),
+        "drain_p99_us": round(float(np.percentile(drain_us, 99)), 2),
+        "drain_max_us": round(max(drain_us), 2)
+    }
+
+def calibrate_trigger_output(count=200):
+    """
+    Calibrates the trigger latency at init_com. The serial port is only written
+    to when trigger_calibration_on_port is set, whether code 0 marks nothing
+    depends on the amplifier; otherwise a pty pair is used as loopback stand-in,
+    so the session still records what the write path of this machine costs.
+
+    Returns:
+        dict: calibration results with the port settings, None if nothing could be measured
+    """
+    if isinstance(trigger_output, SerialTriggerBackend) and trigger_calibration_on_port:
+        backend = trigger_output
+    elif os.name == 'posix':
+        backend = PtyTriggerBackend()  # separate pair, the trigger pty may already have a reader
+    else:
+        backend = None
+        print('No pty available and trigger_calibration_on_port is off, trigger latency not calibrated')
+
+    calibration = {}
+    if backend is not None:
+        try:
+            calibration = calibrate_trigger_latency(backend, count)
+            calibration["stand_in"] = backend is not trigger_output
+        except Exception as e:
+            print(f'Trigger latency calibration failed: {e}')
+        finally:
+            if backend is not trigger_output:
+                backend.close()
+
+    if isinstance(trigger_output, SerialTriggerBackend):
+        calibration.update({
+            "low_latency": trigger_output.low_latency,
+            "write_timeout_s": trigger_output.port.write_timeout,
+            "drain_method": trigger_output.drain_method,
+            "drain_writes": trigger_output.drain_writes
+        })
+    if not calibration:
+        return None
+    print(f"[DEBUG] Trigger latency calibration: {calibration}") if debug else None
+    return calibration
+
 # ==============================
 # Text & Screen Functions
 # ==============================
 
+# Slides whose text never changes
+basic_slides = {
+    'welcome': [
+        u"Bienvenido/a, a este experimento!!!",
+        " ",
+        u"Se te indicará paso a paso que hacer."
+    ],
+    'instructions': [
+        u"¡Bienvenida/o! Este experimento consta de cuatro bloques con",
+        u"descansos de 2 a 3 minutos entre ellos. Durante las pausas aparecerá el",
+        u"mensaje “Fin del bloque X”, y deberás esperar la indicación para continuar.",
+        "",
+        u"En cada ensayo, deberás emparejar la carta central con una de las",
+        u"cuatro cartas de referencia ubicadas en la parte superior. La selección",
+        u"se basa en una regla que puede ser color, forma o número, la cual no",
+        u"se indicará y puede cambiar sin previo aviso.",
+        "",
+        u"Tras cada respuesta, recibirás retroalimentación de “Correcto” o",
+        u"“Incorrecto”, que deberás usar para inferir la regla vigente.",
+        "",
+        u"Para responder, presiona la tecla correspondiente según la posición",
+        u"de la carta de referencia de izquierda a derecha:",
+        u"C (triángulo rojo), V (dos estrellas verdes),",
+        u"B (tres cruces amarillas) y N (cuatro círculos azules).",
+        "",
+        u"Responde lo más rápido posible."
+    ],
+    'pretrial': [
+        u"Ahora comenzaremos con un bloque de práctica para que te familiarices con la tarea.",
+        "",
+        u"Las respuestas en este bloque no serán registradas ni evaluadas,", 
+        u"así que tómate tu tiempo para entender la dinámica."
+    ],
+    'farewell': [
+        u"La tarea ha finalizado.",
+        "",
+        u"Muchas gracias por su colaboración!!"
+    ]
+}
+
 def select_slide(slide_name, variables=None):
     """
     Returns the text content for a given instruction slide.
     """
 
+    if slide_name in basic_slides:
+        return basic_slides[slide_name]
+
     if variables is None:
         variables = {"blockNumber": 0, "practice": False, "trial_types": ["color", "color"]}
 
-    basic_slides = {
-        'welcome': [
-            u"Bienvenido/a, a este experimento!!!",
-            " ",
-            u"Se te indicará paso a paso que hacer."
-        ],
-        'instructions': [
-            u"¡Bienvenida/o! Este experimento consta de cuatro bloques con",
-            u"descansos de 2 a 3 minutos entre ellos. Durante las pausas aparecerá el",
-            u"mensaje “Fin del bloque X”, y deberás esperar la indicación para continuar.",
-            "",
-            u"En cada ensayo, deberás emparejar la carta central con una de las",
-            u"cuatro cartas de referencia ubicadas en la parte superior. La selección",
-            u"se basa en una regla que puede ser color, forma o número, la cual no",
-            u"se indicará y puede cambiar sin previo aviso.",
-            "",
-            u"Tras cada respuesta, recibirás retroalimentación de “Correcto” o",
-            u"“Incorrecto”, que deberás usar para inferir la regla vigente.",
-            "",
-            u"Para responder, presiona la tecla correspondiente según la posición",
-            u"de la carta de referencia de izquierda a derecha:",
-            u"C (triángulo rojo), V (dos estrellas verdes),",
-            u"B (tres cruces amarillas) y N (cuatro círculos azules).",
-            "",
-            u"Responde lo más rápido posible."
-        ],
-        'pretrial': [
-            u"Ahora comenzaremos con un bloque de práctica para que te familiarices con la tarea.",
-            "",
-            u"Las respuestas en este bloque no serán registradas ni evaluadas,", 
-            u"así que tómate tu tiempo para entender la dinámica."
-        ],
-        'posttrial': [
+    if slide_name == 'posttrial':
+        return [
             u"¡Bien hecho! Has completado el bloque de práctica.",
             "",
             u"Como pudiste ver, en este bloque de práctica primero tuviste que responder",
@@ -419,22 +1485,17 @@ def select_slide(slide_name, variables=None):
             "",
             u"Recuerda que la regla puede cambiar en cualquier momento,", 
             u"así que presta atención a la retroalimentación."
-        ],
-        'break': [
+        ]
+    elif slide_name == 'break':
+        return [
             u"Fin del bloque " + str(variables["blockNumber"] + 1) + ".",
             " ",
             u"Tómate de 2 a 3 minutos para descansar.",
             " ",
             u"Cuando estés lista/o para continuar presiona la barra espaciadora."
-        ],
-        'farewell': [
-            u"La tarea ha finalizado.",
-            "",
-            u"Muchas gracias por su colaboración!!"
         ]
-    }
 
-    return basic_slides[slide_name]
+    raise KeyError(slide_name)
 
 def setfonts():
     """Initializes font objects."""
@@ -445,30 +1506,26 @@ def setfonts():
     char = pygame.font.Font(font_path, 32)
     charnext = pygame.font.Font(font_path, 24)
 
-def paragraph(text, key=None, no_foot=False, color=None, limit_time=0,
-              row=None, is_clean=True):
-    """Displays text as a formatted paragraph on screen."""
-
-    if is_clean:
-        screen.fill(background)
+text_surfaces = {}  # (font, text, color) -> rendered surface
+slide_frames = {}   # (resolution, text, key, no_foot, color, row) -> full-frame surface
 
-    if isinstance(text, str):
-        text = [text]
+def render_text(font, text, color):
+    """Renders a line of text once and returns the cached surface afterwards."""
+    text_key = (font, text, tuple(color))
+    if text_key not in text_surfaces:
+        text_surfaces[text_key] = font.render(text, True, color)
+    return text_surfaces[text_key]
 
+def draw_paragraph(surface, text, key, no_foot, color, row):
+    """Draws the lines of a paragraph and its footer on the given surface."""
     if row is None:
-        row = center[1] - 20 * len(text)
-
-    if color is None:
-        color = char_color
-
-    if debug:
-        print(text)
+        row = layout.text_center[1] - layout.line_height // 2 * len(text)
 
     for line in text:
-        phrase = char.render(line, True, color)
-        phrasebox = phrase.get_rect(centerx=center[0], top=row)
-        screen.blit(phrase, phrasebox)
-        row += 40
+        phrase = render_text(char, line, color)
+        phrasebox = phrase.get_rect(centerx=layout.text_center[0], top=row)
+        surface.blit(phrase, phrasebox)
+        row += layout.line_height
 
     if key is not None:
         if key == K_SPACE:
@@ -481,10 +1538,49 @@ def paragraph(text, key=None, no_foot=False, color=None, limit_time=0,
     if no_foot:
         foot = ""
 
-    nextpage = charnext.render(foot, True, charnext_color)
-    nextbox = nextpage.get_rect(left=15, bottom=resolution[1] - 15)
-    screen.blit(nextpage, nextbox)
-    pygame.display.flip()
+    nextpage = render_text(charnext, foot, charnext_color)
+    nextbox = nextpage.get_rect(bottomleft=layout.footer_anchor)
+    surface.blit(nextpage, nextbox)
+
+def paragraph_frame(text, key, no_foot, color, row):
+    """Returns the full-frame surface of a paragraph on a clean screen, rendering it only once."""
+    frame_key = (resolution, tuple(text), key, no_foot, tuple(color), row)
+    if frame_key not in slide_frames:
+        frame = frame_templates[resolution]["blank"].copy()
+        draw_paragraph(frame, text, key, no_foot, color, row)
+        slide_frames[frame_key] = frame
+    return slide_frames[frame_key]
+
+def prerender_slides():
+    """Pre-renders every slide whose content is known before the session starts."""
+    paragraph_frame(select_slide('instructions'), K_SPACE, False, char_color, None)
+    paragraph_frame(select_slide('pretrial'), K_SPACE, False, char_color, None)
+    paragraph_frame(select_slide('farewell'), K_SPACE, True, char_color, None)
+    for block_number in range(TOTAL_BLOCKS - 1):
+        paragraph_frame(select_slide('break', variables={"blockNumber": block_number}), K_SPACE, False, char_color, None)
+
+    if debug:
+        print(f"[DEBUG] {len(slide_frames)} slides pre-rendered")
+
+def paragraph(text, key=None, no_foot=False, color=None, limit_time=0,
+              row=None, is_clean=True):
+    """Displays text as a formatted paragraph on screen."""
+
+    if isinstance(text, str):
+        text = [text]
+
+    if color is None:
+        color = char_color
+
+    if debug:
+        print(text)
+
+    if is_clean:
+        screen.blit(paragraph_frame(text, key, no_foot, color, row), (0, 0))
+    else:
+        draw_paragraph(screen, text, key, no_foot, color, row)
+
+    display_presenter.present("slide")
 
     if key is not None or limit_time != 0:
         wait(key, limit_time)
@@ -498,7 +1594,7 @@ def init():
     setfonts()
 
     global screen, resolution, center, background
-    global char_color, charnext_color, fix, fixbox
+    global char_color, charnext_color, fix, fixbox, card_cache, display_presenter, layout, event_waiter
 
     pygame.init()
     pygame.display.init()
@@ -508,41 +1604,103 @@ def init():
     if FullScreenShow:
         resolution = (pygame.display.Info().current_w,
                       pygame.display.Info().current_h)
-        screen = pygame.display.set_mode(resolution, FULLSCREEN)
+        screen = open_display(resolution, FULLSCREEN)
     else:
         try:
             resolution = pygame.display.list_modes()[3]
         except Exception:
             resolution = (1280, 720)
-        screen = pygame.display.set_mode(resolution)
+        screen = open_display(resolution)
+
+    # A vsync display is SCALED and goes through a renderer, where display.update(rects)
+    # presents the whole frame anyway: dirty rectangles only apply without vsync
+    effective_update_mode = "flip" if session_metadata["vsync"] else display_update_mode
+    if effective_update_mode != display_update_mode:
+        print(f"[DEBUG] Display update mode {display_update_mode} not available with vsync, using flip") if debug else None
+    session_metadata["display_update_mode"] = effective_update_mode
+    display_presenter = DisplayPresenter(effective_update_mode)
+
+    # Only the event types we use reach the queue, waits block instead of spinning
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed(allowed_event_types)
+    event_waiter = EventWaiter(event_wait_spin_ms)
 
-    center = (resolution[0] // 2, resolution[1] // 2)
     background = Color('lightgray')
+
+    # Real refresh interval, phase durations are rounded to whole frames of it
+    measure_refresh_interval(refresh_calibration_flips)
+
+    # Screen geometry of this display mode, card proportions taken from a reference card
+    if card_source == "vector":
+        card_ratio = vector_card_ratio
+    else:
+        card_real_size = pygame.image.load(static_images_list[0]).get_size()
+        card_ratio = card_real_size[1] / card_real_size[0]
+    layout = get_layout(resolution, card_ratio)
+
+    center = layout.center
     char_color = Color('black')
     charnext_color = Color('black')
 
     fix = char.render('+', True, char_color)
-    fixbox = fix.get_rect(center=center)
+    fixbox = fix.get_rect(center=layout.center)
+
+    # Pre-scaled card surfaces, loaded once so trials never touch the disk
+    all_cards = single_images_list + double_images_list + static_images_list
+    card_cache = CardSurfaceCache(card_cache_budget_mb)
+    if card_source == "vector":
+        card_sources = {image_path: (render_vector_card(card_registry[image_path], layout.card_size), False)
+                        for image_path in all_cards}
+    elif pixel_cache_enabled:
+        card_sources = load_pixel_cache(all_cards, layout.card_size)
+    elif card_atlas_enabled:
+        card_sources = load_card_atlas(all_cards)
+    else:
+        card_sources = None
+    card_cache.preload(all_cards, layout.card_size, card_sources)
+
+    # Full-frame screens of every trial phase
+    build_frame_templates()
+
+    # Static slides, so switching slides costs only a blit
+    prerender_slides()
 
     screen.fill(background)
-    pygame.display.flip()
+    display_presenter.present("slide")
+
+def open_display(resolution, flags=0):
+    """
+    Opens the display, with vsync when vsync_enabled so that flip() returns at the
+    vertical blank. pygame only honours vsync on SCALED displays, if the driver
+    refuses it a display without vsync is opened instead.
+    """
+    if vsync_enabled:
+        try:
+            display = pygame.display.set_mode(resolution, flags | SCALED, vsync=1)
+            session_metadata["vsync"] = True
+            return display
+        except pygame.error as e:
+            print(f"[DEBUG] vsync not available: {e}") if debug else None
+
+    session_metadata["vsync"] = False
+    return pygame.display.set_mode(resolution, flags)
 
 def blackscreen(blacktime=0):
     """Clears the screen."""
     screen.fill(background)
-    pygame.display.flip()
-    pygame.time.delay(blacktime)
+    display_presenter.present("slide")
+    precise_delay(blacktime)
 
 def ends():
     """Ends the experiment safely."""
     blackscreen()
-    dot = char.render('.', True, char_color)
-    dotbox = dot.get_rect(left=15, bottom=resolution[1] - 15)
+    dot = render_text(char, '.', char_color)
+    dotbox = dot.get_rect(bottomleft=layout.footer_anchor)
     screen.blit(dot, dotbox)
-    pygame.display.flip()
+    display_presenter.present("slide", [dotbox])
 
     while True:
-        for event in pygame.event.get():
+        for event in event_waiter.wait():
             if event.type == KEYUP and event.key == K_ESCAPE:
                 pygame_exit()
 
@@ -554,45 +1712,338 @@ def pygame_exit():
 # Protocol Handler Functions
 # ==============================
 
-def draw_cross(color, center, size, thickness=16):
+def draw_cross(color, center, size, thickness=16, surface=None):
+    surface = screen if surface is None else surface
     x, y = center
     half = size // 2
-    pygame.draw.line(screen, color, (x - half, y - half), (x + half, y + half), thickness)
-    pygame.draw.line(screen, color, (x - half, y + half), (x + half, y - half), thickness)
+    pygame.draw.line(surface, color, (x - half, y - half), (x + half, y + half), thickness)
+    pygame.draw.line(surface, color, (x - half, y + half), (x + half, y - half), thickness)
 
 
-def draw_check(color, center, size, thickness=16):
+def draw_check(color, center, size, thickness=16, surface=None):
+    surface = screen if surface is None else surface
     x, y = center
     pygame.draw.line(
-        screen, color,
+        surface, color,
         (x - size // 2, y),
         (x - size // 6, y + size // 2),
         thickness
     )
     pygame.draw.line(
-        screen, color,
+        surface, color,
         (x - size // 6, y + size // 2),
         (x + size // 2, y - size // 2),
         thickness
     )
 
+# ==============================
+# Screen Layout
+# ==============================
+
+class Layout:
+    """
+    Screen geometry of one display mode: every card rectangle, the feedback
+    glyph and the text anchors. Sizes are proportional to the screen.
+    """
+    def __init__(self, resolution, card_ratio):
+        width, height = resolution
+
+        self.center = (width // 2, height // 2)
+
+        # Limited by the height too: each card row gets half of the screen (centered at 1/4 and 3/4)
+        card_width = int(min(width * card_width_ratio, height * card_height_ratio / card_ratio))
+        self.card_size = (card_width, int(card_width * card_ratio))
+
+        # Target card centered in the lower half
+        self.target_rect = pygame.Rect((0, 0), self.card_size)
+        self.target_rect.center = (width // 2, (height // 4) * 3)
+
+        # 4 reference cards evenly spaced in the top part of the screen
+        self.reference_rects = []
+        for count in range(4):
+            reference_rect = pygame.Rect((0, 0), self.card_size)
+            reference_rect.center = (int(width / 8 + count * (width / 4)), (height // 8) * 2)
+            self.reference_rects.append(reference_rect)
+
+        # Feedback glyph (check / cross) relative to the card width (120 px and 16 px for a 300 px card)
+        self.feedback_size = int(card_width * 0.4)
+        self.feedback_thickness = max(1, int(card_width * 16 / 300))
+        self.feedback_rect = pygame.Rect(0, 0, self.feedback_size + self.feedback_thickness,
+                                         self.feedback_size + self.feedback_thickness)
+        self.feedback_rect.center = self.center
+
+        # Text anchors
+        self.text_center = self.center
+        self.line_height = 40
+        self.footer_anchor = (15, height - 15)
+
+layouts = {}  # (resolution, card ratio) -> Layout
+
+def get_layout(resolution, card_ratio):
+    """Returns the layout of a display mode, computing it only once."""
+    layout_key = (tuple(resolution), card_ratio)
+    if layout_key not in layouts:
+        layouts[layout_key] = Layout(resolution, card_ratio)
+    return layouts[layout_key]
+
+# ==============================
+# Frame Templates
+# ==============================
+
+frame_templates = {}  # resolution -> {template name: full-frame surface}
+frame_template_rects = {}  # resolution -> {template name: list of drawn rects}
+
+def build_frame_templates():
+    """
+    Renders every trial phase screen once for the current resolution, so that
+    each phase change is a single blit and flip.
+
+    Templates:
+        blank, fixation, correct, incorrect, reference_row
+    """
+    if resolution in frame_templates:
+        return frame_templates[resolution]
+
+    blank = pygame.Surface(resolution).convert()
+    blank.fill(background)
+
+    fixation = blank.copy()
+    fixation.blit(fix, fixbox)
+
+    correct = blank.copy()
+    draw_check((0, 200, 0), layout.center, layout.feedback_size, layout.feedback_thickness, surface=correct)
+
+    incorrect = blank.copy()
+    draw_cross((200, 0, 0), layout.center, layout.feedback_size, layout.feedback_thickness, surface=incorrect)
+
+    # all 4 base images in the top part of the screen
+    reference_row = blank.copy()
+    for actual_image, reference_rect in zip(static_images_list, layout.reference_rects):
+        reference_row.blit(card_cache.get(actual_image), reference_rect)
+
+    frame_templates[resolution] = {
+        "blank": blank,
+        "fixation": fixation,
+        "correct": correct,
+        "incorrect": incorrect,
+        "reference_row": reference_row
+    }
+
+    # Regions of each template that differ from the blank screen
+    frame_template_rects[resolution] = {
+        "blank": [],
+        "fixation": [fixbox],
+        "correct": [layout.feedback_rect],
+        "incorrect": [layout.feedback_rect],
+        "reference_row": layout.reference_rects
+    }
+
+    if debug:
+        print(f"[DEBUG] Frame templates rendered for resolution {resolution}")
+
+    return frame_templates[resolution]
+
+def show_frame_template(template_name, phase):
+    """Blits a pre-rendered full-frame template and pushes it to the display."""
+    screen.blit(frame_templates[resolution][template_name], (0, 0))
+    display_presenter.present(phase, frame_template_rects[resolution][template_name])
+
+# ==============================
+# Display Updates
+# ==============================
+
+class DisplayPresenter:
+    """
+    Pushes frames to the display, either as full flips or as dirty rectangles.
+    The cost of every display update is recorded per phase.
+    """
+    def __init__(self, mode="dirty"):
+        self.mode = mode
+        self.previous_rects = []
+        self.stats = {}  # phase -> [updates, total ms, max ms]
+
+    def present(self, phase, rects=None):
+        """
+        Updates the display.
+
+        Parameters:
+            phase (str): Name used to group the update cost
+            rects (list): Regions drawn in this frame, None if the whole frame changed
+        """
+        start_ns = perf_counter_ns()
+
+        if self.mode == "dirty" and rects is not None:
+            # Regions drawn in the previous frame must be pushed too, to erase them
+            pygame.display.update(self.previous_rects + rects)
+        else:
+            pygame.display.flip()
+
+        elapsed_ms = (perf_counter_ns() - start_ns) / 1e6
+        self.previous_rects = [screen.get_rect()] if rects is None else list(rects)
+
+        phase_stats = self.stats.setdefault(phase, [0, 0.0, 0.0])
+        phase_stats[0] += 1
+        phase_stats[1] += elapsed_ms
+        phase_stats[2] = max(phase_stats[2], elapsed_ms)
+
+    def summary(self):
+        """Returns the update cost per phase in milliseconds."""
+        return {
+            phase: {
+                "mode": self.mode,
+                "updates": updates,
+                "mean_ms": round(total_ms / updates, 4),
+                "max_ms": round(max_ms, 4)
+            }
+            for phase, (updates, total_ms, max_ms) in self.stats.items()
+        }
+
+# ==============================
+# Display Refresh
+# ==============================
+
+refresh_interval_ns = int(1e9 / nominal_refresh_hz)  # measured in init() by measure_refresh_interval
+
+def measure_refresh_interval(flips=refresh_calibration_flips):
+    """
+    Measures the display refresh interval as the median time between repeated
+    flips of the background. If the flips return faster than any real display
+    refreshes they are not synchronised to it, and nominal_refresh_hz is used.
+
+    Returns:
+        int: refresh interval in ns
+    """
+    global refresh_interval_ns
+
+    screen.fill(background)
+    pygame.display.flip()
+
+    intervals_ns = []
+    last_ns = perf_counter_ns()
+    for _ in range(flips):
+        pygame.display.flip()
+        now_ns = perf_counter_ns()
+        intervals_ns.append(now_ns - last_ns)
+        last_ns = now_ns
+
+    intervals_ms = np.array(intervals_ns) / 1e6
+    measured_ms = float(np.median(intervals_ms))
+    vsync_locked = measured_ms >= 2  # no display refreshes faster than 500 Hz
+
+    refresh_interval_ns = int(measured_ms * 1e6) if vsync_locked else int(1e9 / nominal_refresh_hz)
+
+    session_metadata["display_refresh"] = {
+        "flips": flips,
+        "measured_interval_ms": round(measured_ms, 4),
+        "interval_sd_ms": round(float(intervals_ms.std()), 4),
+        "vsync_locked": vsync_locked,
+        "frame_interval_ms": round(refresh_interval_ns / 1e6, 4),
+        "refresh_hz": round(1e9 / refresh_interval_ns, 2)
+    }
+    print(f"[DEBUG] Display refresh: {session_metadata['display_refresh']}") if debug else None
+
+    return refresh_interval_ns
+
+def frames_for(duration_ms):
+    """Returns the whole number of refreshes closest to duration_ms (at least one)."""
+    return max(1, round(duration_ms * 1_000_000 / refresh_interval_ns))
+
+def frames_ms(frames):
+    """Returns the duration in ms of a number of refreshes."""
+    return frames * refresh_interval_ns / 1e6
+
+# ==============================
+# Event Waiting
+# ==============================
+
+# Event types used by the experiment, every other type is kept out of the queue
+# (USEREVENT + 1: wait() timeout, USEREVENT + 2: show_images phase change)
+allowed_event_types = [QUIT, KEYDOWN, KEYUP, USEREVENT + 1, USEREVENT + 2]
+
+class EventWaiter:
+    """
+    Waits for events blocking the thread with pygame.event.wait instead of
+    spinning on pygame.event.get, and polls only close to a known deadline.
+    Records wall and main thread CPU time spent waiting and the worst wake-up latency
+    after a deadline.
+    """
+    def __init__(self, spin_ms=event_wait_spin_ms):
+        self.spin_ns = int(spin_ms * 1_000_000)
+        self.waits = 0
+        self.wall_ns = 0
+        self.cpu_ns = 0
+        self.max_wakeup_latency_ns = 0
+
+    def wait(self, deadline_ns=None, due_event_type=None):
+        """
+        Returns the pending events, blocking until at least one arrives.
+
+        Parameters:
+            deadline_ns (int): perf_counter_ns time at which an event is expected (e.g. a timer),
+                               the wait polls from spin_ms before it until the event arrives
+            due_event_type (int): event returned by the wait itself once deadline_ns is reached,
+                                  so the deadline does not depend on an SDL timer
+        """
+        start_ns = perf_counter_ns()
+        start_cpu_ns = thread_time_ns()
+
+        events = pygame.event.get()
+        while not events:
+            if deadline_ns is None:
+                event = pygame.event.wait()  # no deadline, block until an event arrives
+            elif deadline_ns - perf_counter_ns() <= self.spin_ns:
+                events = pygame.event.get()  # close to or past the deadline, spin
+                if not events and due_event_type is not None and perf_counter_ns() >= deadline_ns:
+                    events = [pygame.event.Event(due_event_type)]
+                continue
+            else:
+                event = pygame.event.wait(max(1, (deadline_ns - perf_counter_ns() - self.spin_ns) // 1_000_000))
+
+            if event.type != NOEVENT:
+                events = [event] + pygame.event.get()
+
+        end_ns = perf_counter_ns()
+        self.waits += 1
+        self.wall_ns += end_ns - start_ns
+        self.cpu_ns += thread_time_ns() - start_cpu_ns
+        if deadline_ns is not None and events and end_ns >= deadline_ns:
+            self.max_wakeup_latency_ns = max(self.max_wakeup_latency_ns, end_ns - deadline_ns)
+
+        return events
+
+    def summary(self):
+        """Returns the waiting cost: CPU time saved compared to spinning the whole wall time."""
+        return {
+            "waits": self.waits,
+            "wall_s": round(self.wall_ns / 1e9, 3),
+            "cpu_s": round(self.cpu_ns / 1e9, 3),
+            "cpu_saved_s": round((self.wall_ns - self.cpu_ns) / 1e9, 3),
+            "max_wakeup_latency_ms": round(self.max_wakeup_latency_ns / 1e6, 3)
+        }
+
+def set_phase_timer(event_type, delay_ms):
+    """Starts a one-shot timer and returns the perf_counter_ns time it is due."""
+    pygame.time.set_timer(event_type, delay_ms, loops=1)
+    return perf_counter_ns() + delay_ms * 1_000_000
+
 def wait(key, limit_time):
     """Waits for a key press or a timeout."""
 
     TIME_OUT_WAIT = USEREVENT + 1
 
+    deadline_ns = None
     if limit_time != 0:
-        pygame.time.set_timer(TIME_OUT_WAIT, limit_time, loops=1)
+        deadline_ns = set_phase_timer(TIME_OUT_WAIT, limit_time)
 
     start_time = pygame.time.get_ticks()
     waiting = True
 
     while waiting:
-        for event in pygame.event.get():
-            if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
+        for event in event_waiter.wait(deadline_ns):
+            if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
                 pygame_exit()
 
-            elif event.type == KEYUP:
+            elif event.type == KEYDOWN:
                 if event.key == key:
                     waiting = False
 
@@ -604,8 +2055,47 @@ def wait(key, limit_time):
 
     return pygame.time.get_ticks() - start_time
 
-def wait_answer(image, series_type):
-    """Waits for a response from the user and returns the answer details."""
+pending_key_release = None  # answer whose response key has not been released yet
+
+def event_time_ns(event, clock_anchor):
+    """
+    Returns the perf_counter_ns time of an input event: the time it is pulled
+    from the queue. pygame 2.5 events carry no SDL timestamp; the mapping of
+    event.timestamp (ms) through clock_anchor is only for pygame versions that expose it.
+
+    Parameters:
+        event (pygame.event.Event): Input event
+        clock_anchor (tuple): (perf_counter_ns, pygame ticks) taken at the same instant
+    """
+    timestamp = getattr(event, "timestamp", None)
+    if timestamp is None:
+        return perf_counter_ns()
+    return clock_anchor[0] + (timestamp - clock_anchor[1]) * 1_000_000
+
+def record_key_release(event):
+    """Stores how long the response key was held once its KEYUP arrives."""
+    global pending_key_release
+    if pending_key_release is not None and event.key == pending_key_release['pressed_key']:
+        pending_key_release['key_duration'] = pygame.time.get_ticks() - pending_key_release['press_time']
+        pending_key_release = None
+
+def wait_answer(image, series_type, stimulus_onset=None, correct_row=None):
+    """
+    Waits for a response from the user and returns the answer details.
+    The response is taken at key press, its release is recorded later by record_key_release.
+    Key presses from before the stimulus flip are already discarded by discard_anticipations.
+
+    Parameters:
+        image (Path): Target card
+        series_type (str): Active rule
+        stimulus_onset (tuple): (perf_counter_ns, pygame ticks) right after the stimulus flip
+        correct_row (np.ndarray): correctness of each answer for this card and rule, looked up if None
+
+    Returns:
+        dict: answer details, 'rt' in whole ms from the start of this function (legacy)
+        and 'rt_hr' in ms from the stimulus flip, from the event time
+    """
+    global pending_key_release
 
     answer_keys = {
         K_c: 0,
@@ -614,88 +2104,295 @@ def wait_answer(image, series_type):
         K_n: 3
     }
 
-    correct_answer = type_orders.index(series_type)
+    if correct_row is None:
+        correct_row = correctness_matrix[card_registry[image].index, :, type_orders.index(series_type)]
     selected_answer = None
     rt = None
     waiting = True
     start_time = pygame.time.get_ticks()
 
+    if stimulus_onset is None:
+        stimulus_onset = (perf_counter_ns(), start_time)
+
     while waiting:
-        for event in pygame.event.get():
-            if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
+        for event in event_waiter.wait():
+            if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
                 pygame_exit()
 
             elif event.type == KEYUP:
+                record_key_release(event)
+
+            elif event.type == KEYDOWN and waiting:
                 if event.key in answer_keys:
+                    response_ns = event_time_ns(event, stimulus_onset)
+                    rt_hr = (response_ns - stimulus_onset[0]) / 1e6
+                    press_time = pygame.time.get_ticks()
                     selected_answer = answer_keys[event.key]
-                    rt = pygame.time.get_ticks() - start_time
+                    rt = press_time - start_time
 
-                    if translate_helper[static_images_list[answer_keys[event.key]].parts[-1].split('.')[0].split('_')[correct_answer]] == translate_helper[image.parts[-1].split(".")[0].split('_')[correct_answer]]:
-                        is_correct = True
-                    else:
-                        is_correct = False
+                    is_correct = bool(correct_row[selected_answer])
+
+                    # the release of this key may already be in the queue
+                    pending_key_release = answer = {'series_type': series_type,
+                                                    'selected_answer': selected_answer,
+                                                    'is_correct': is_correct,
+                                                    'rt': rt,
+                                                    'rt_hr': rt_hr,
+                                                    'response_ns': response_ns,
+                                                    'pressed_key': event.key,
+                                                    'press_time': press_time,
+                                                    'key_duration': None}
 
                     waiting = False
 
-    return {'series_type': series_type,
-            'selected_answer': selected_answer,
-            'is_correct': is_correct,
-            'rt': rt,}
+    return answer
+
+# ==============================
+# Phase Scheduling
+# ==============================
+
+class PhaseScheduler:
+    """
+    Keeps the show_images phase changes on absolute perf_counter_ns deadlines.
+    Every deadline is the previous planned one plus the phase duration, so an
+    overrun shortens the next phase instead of pushing back every later trial.
+    Only the response, whose time is not known ahead, re-anchors the plan.
+    """
+    def __init__(self, first_phase_ms):
+        self.block_start_ns = perf_counter_ns()
+        self.deadline_ns = self.block_start_ns + int(first_phase_ms * 1_000_000)
+        self.onsets = []
+        self.anticipations = []
+
+    def advance(self, duration_ms):
+        """Plans the next phase change duration_ms after the current planned one."""
+        self.deadline_ns += int(duration_ms * 1_000_000)
+        return self.deadline_ns
+
+    def anchor(self, anchor_ns, duration_ms):
+        """Plans the next phase change duration_ms after anchor_ns (e.g. the response)."""
+        self.deadline_ns = anchor_ns + int(duration_ms * 1_000_000)
+        return self.deadline_ns
+
+    def log_onset(self, trial, phase, planned_ns, achieved_ns, requested_frames=None, trigger_ns=None, overrun_ns=None):
+        """
+        Stores the planned and achieved onset of a phase, in ms from the block start.
+        The refreshes the previous phase actually lasted are filled in from this onset.
+
+        Parameters:
+            requested_frames (int): refreshes the phase should last, None if it ends on a response
+            trigger_ns (int): time the onset trigger write returned, None if none was sent
+            overrun_ns (int): time the triggers before the onset ran past it, None if the phase sends none
+        """
+        if self.onsets:
+            previous = self.onsets[-1]
+            previous['achieved_frames'] = round((achieved_ns - self.block_start_ns - previous['achieved_ms'] * 1e6) / refresh_interval_ns)
+
+        self.onsets.append({'trial': trial,
+                            'phase': phase,
+                            'planned_ms': (planned_ns - self.block_start_ns) / 1e6,
+                            'achieved_ms': (achieved_ns - self.block_start_ns) / 1e6,
+                            'offset_ms': (achieved_ns - planned_ns) / 1e6,
+                            'requested_frames': requested_frames,
+                            'achieved_frames': None,
+                            'trigger_offset_ms': (trigger_ns - achieved_ns) / 1e6 if trigger_ns is not None else None,
+                            'overrun_ms': overrun_ns / 1e6 if overrun_ns is not None else None,
+                            'key': None})
+
+        if overrun_ns:
+            print(f"[DEBUG] Triggers of trial {trial} ran {overrun_ns / 1e6:.3f} ms past the {phase} onset") if debug else None
+
+    def log_anticipation(self, trial, key, time_ns):
+        """Stores a key pressed before the stimulus of a trial, in ms from the block start."""
+        self.anticipations.append({'trial': trial,
+                                   'phase': "anticipation",
+                                   'planned_ms': None,
+                                   'achieved_ms': (time_ns - self.block_start_ns) / 1e6,
+                                   'offset_ms': None,
+                                   'requested_frames': None,
+                                   'achieved_frames': None,
+                                   'trigger_offset_ms': None,
+                                   'overrun_ms': None,
+                                   'key': pygame.key.name(key)})
+
+    def rows(self):
+        """Returns the phase onsets and anticipations in time order."""
+        return sorted(self.onsets + self.anticipations, key=lambda row: row['achieved_ms'])
+
+    def summary(self):
+        """Returns the mean and worst onset offset (ms) of every phase."""
+        offsets = {}
+        for onset in self.onsets:
+            offsets.setdefault(onset['phase'], []).append(onset['offset_ms'])
+
+        summary = {phase: {"onsets": len(values),
+                           "mean_offset_ms": round(sum(values) / len(values), 3),
+                           "max_offset_ms": round(max(values), 3)}
+                   for phase, values in offsets.items()}
+        summary["anticipations"] = len(self.anticipations)
+        summary["trigger_overruns"] = sum(1 for onset in self.onsets if onset['overrun_ms'])
+        return summary
+
+def discard_anticipations(phase_scheduler, trial):
+    """
+    Removes the key presses waiting in the queue, so a response can only come
+    from a key pressed after the stimulus, and logs them as anticipations.
+    Key releases stay in the queue for record_key_release.
+    """
+    drained_ns = perf_counter_ns()
+    for event in pygame.event.get(KEYDOWN):
+        if event.key == K_ESCAPE:
+            pygame_exit()
+        phase_scheduler.log_anticipation(trial, event.key, drained_ns)
+
+def wait_for_onset(onset_ns):
+    """
+    Waits for the queued triggers to go out and then until onset_ns, so an onset
+    lands trigger_gap ms after its phase began whatever triggers were sent.
+
+    Returns:
+        int: ns the triggers ran past onset_ns, 0 if they fitted before it
+    """
+    trigger_dispatcher.wait_idle()
+    overrun_ns = max(0, perf_counter_ns() - onset_ns)
+    wait_until_ns(onset_ns)
+    return overrun_ns
+
+# ==============================
+# Trial Prefetch
+# ==============================
+
+next_trial_frame = None  # composed target frame of the next trial, reused every trial
+
+def next_trial_position(image_list, serie_count, image_count):
+    """Returns the (serie_count, image_count) of the trial after the given one, None at the end of the block."""
+    image_count += 1
+    if image_list[serie_count]["serie_size"] <= image_count:
+        serie_count, image_count = serie_count + 1, 0
+        if serie_count >= len(image_list):
+            return None
+    return serie_count, image_count
+
+def prepare_trial(image_list, series_types, serie_count, image_count):
+    """
+    Prepares what the target phase of a trial needs ahead of time, so that phase
+    only waits for its deadline, sends and flips: the composed target frame and
+    the correctness row of the card under the active rule. The trigger bytes are
+    added by trial_triggers once the previous feedback is known.
+
+    Returns:
+        dict: prepared trial
+    """
+    global next_trial_frame
+
+    image = image_list[serie_count]["order"][image_count]
+    card = card_registry[image]
+    series_type = series_types[serie_count]
+
+    if next_trial_frame is None or next_trial_frame.get_size() != resolution:
+        next_trial_frame = pygame.Surface(resolution).convert()
 
-def show_image_trial(image, scale, trial_block=False):
-    global base_images_loaded, base_images_list
-    screen.fill(background)
     try:
-        picture = pygame.image.load(image)
-        if not base_images_loaded:
-            for actual_image in static_images_list:
-                base_images_list.append(pygame.image.load(actual_image))
-            base_images_loaded = True
+        picture = card_cache.get(image)
+        # all 4 base images are already drawn in the reference row template
+        next_trial_frame.blit(frame_templates[resolution]["reference_row"], (0, 0))
+        next_trial_frame.blit(picture, layout.target_rect)
+        frame = next_trial_frame
     except pygame.error as e:
         print(f"Error al cargar imagen {image}: {e}") if debug else None
-        return
-    
-    image_real_size = picture.get_size()
-    percentage = scale / image_real_size[0]
-    picture = pygame.transform.scale(picture, [int(scale), int(image_real_size[1]*percentage)])
+        frame = None
+
+    return {'serie_count': serie_count,
+            'image_count': image_count,
+            'image': image,
+            'card': card,
+            'series_type': series_type,
+            'new_serie': image_count == 0,
+            'last_image': image_list[serie_count]["serie_size"] - 1 == image_count,
+            'frame': frame,
+            'correct_row': correctness_matrix[card.index, :, type_orders.index(series_type)],
+            'triggers': None}
+
+def trial_triggers(trial, last_feedback):
+    """
+    Returns the trigger bytes sent before the target of a trial, in sending order.
+
+    Parameters:
+        trial (dict): Prepared trial
+        last_feedback (str): trigger_helper key of the previous trial's feedback, None if not sent
+    """
+    triggers = []
+    if trial['new_serie']:
+        triggers += [trigger_helper["first_stimulus_per_serie"], trigger_helper[f"actual_rule_{trial['series_type']}"]]
+    if last_feedback is not None:
+        triggers.append(trigger_helper[last_feedback])
+    if trial['last_image']:
+        triggers.append(trigger_helper["last_target_card"])
+    triggers += trial['card'].triggers  # color, figure and number triggers
+    return bytes(triggers)
+
+def show_image_trial(frame, trial_block=False):
+    """
+    Shows a prepared target frame and sends the stimulus onset trigger as soon
+    as the flip returns.
 
-    center = [int(resolution[0] / 2), int(resolution[1] / 4)*3]
+    Returns:
+        tuple: (perf_counter_ns, pygame ticks) right after the flip returns and the
+        perf_counter_ns time the trigger write returned (None if not sent),
+        (None, None) if the card could not be prepared
+    """
+    if frame is None:
+        return None, None
 
-    # show all 4 base images in the top part of the screen
-    for count, base_image in enumerate(base_images_list):
-        base_image_scaled = pygame.transform.scale(base_image, [int(scale), int(image_real_size[1]*percentage)])
-        base_center = [int(resolution[0] / 8 + count * (resolution[0] / 4)), int(resolution[1] / 8)*2]
-        screen.blit(base_image_scaled, [base_center[0] - base_image_scaled.get_size()[0]/2, base_center[1] - base_image_scaled.get_size()[1]/2])
+    screen.blit(frame, (0, 0))
+    display_presenter.present("target", layout.reference_rects + [layout.target_rect])
+    flip_ns = perf_counter_ns()
 
+    trigger_ns = None
     if not trial_block:
-        send_trigger(trigger_helper["stimulus_onset"])  # Stimulus onset trigger after all other triggers to maintain consistent timing of stimulus presentation in relation to triggers
+        trigger_ns = trigger_dispatcher.send_now(trigger_helper["stimulus_onset"])  # Stimulus onset trigger right after the flip, with vsync the pixels are on screen
 
-    screen.blit(picture, [x - picture.get_size()[count]/2 for count, x in enumerate(center)])
-    pygame.display.flip()
+    return (flip_ns, pygame.time.get_ticks()), trigger_ns
 
-def show_images(image_list, uid=None, dfile=None, block=None, series_types=None, trial_block=False):
+def show_images(image_list, uid=None, dfile=None, block=None, series_types=None, trial_block=False, tfile=None):
 
     phase_change = USEREVENT + 2
 
     done = False
     image_count = -1
     serie_count = 0
+    trial_count = 0
+
+    # Jittered durations of every trial in whole refreshes, sampled up front so the whole block can be planned
+    # (fixation_frames[0] is the fixed first fixation, the last one follows the last trial).
+    # The trigger_gap (ms) before the target and feedback onsets is left for trigger launches and counts in the phase before them.
+    n_trials = sum(serie["serie_size"] for serie in image_list)
+    fixation_frames = [frames_for(600 + trigger_gap)] + [frames_for(randint(1500, 2000)) for _ in range(n_trials)]
+    blank_frames = [frames_for(randint(800, 1000)) for _ in range(n_trials)]
+    feedback_frames = frames_for(1500)
+
+    phase_scheduler = PhaseScheduler(frames_ms(fixation_frames[0]) - trigger_gap)
+    trigger_dispatcher.start_block(block, phase_scheduler.block_start_ns)
 
     if not trial_block:
         sleepy_trigger(trigger_helper[f"block_{block}_start"], 20)
-        send_trigger(trigger_helper["fixation"])
+        trigger_dispatcher.wait_idle()
+        trigger_dispatcher.send_now(trigger_helper["fixation"])
 
-    screen.fill(background)
-    screen.blit(fix, fixbox)
-    pygame.display.update(fixbox)
-    pygame.display.flip()
-    pygame.time.set_timer(phase_change, 600, loops=1)
+    # The first fixation is planned once the block start triggers are out, the block clock keeps its start
+    fixation_planned_ns = perf_counter_ns()
+    phase_scheduler.anchor(fixation_planned_ns, frames_ms(fixation_frames[0]) - trigger_gap)
+
+    show_frame_template("fixation", "fixation")
+    phase_scheduler.log_onset(1, "fixation", fixation_planned_ns, perf_counter_ns(), fixation_frames[0])
 
     answers_list = []
 
     actual_phase = 2
 
-    first_stimulus_trigger_sent = False
+    # the first trial is prepared during the first fixation, every other one during the previous response and feedback
+    next_trial = prepare_trial(image_list, series_types, 0, 0)
+    next_trial['triggers'] = trial_triggers(next_trial, None)
 
     corrects_in_series = 0
     incorrects_in_series = 0
@@ -712,191 +2409,199 @@ def show_images(image_list, uid=None, dfile=None, block=None, series_types=None,
                 if serie_count >= len(image_list):
                     done = True
                     break
-            
-            card_number = image_list[serie_count]["order"][image_count].parts[-1].split('.')[0].split('_')[0]
-            card_figure = translate_helper[image_list[serie_count]["order"][image_count].parts[-1].split('.')[0].split('_')[1]]
-            card_color = translate_helper[image_list[serie_count]["order"][image_count].parts[-1].split('.')[0].split('_')[2]]
 
     else:
         while not done:
-            for event in pygame.event.get():
+            for event in event_waiter.wait(phase_scheduler.deadline_ns, phase_change):
+                if event.type == KEYUP:
+                    record_key_release(event)
+
                 if event.type == KEYUP and event.key == K_ESCAPE and debug:
                     pygame_exit()
 
                 elif event.type == KEYUP and event.key == K_p and debug:
                     done = True
 
+                elif event.type == KEYDOWN:
+                    # no response window is open, the next stimulus has not been shown yet
+                    phase_scheduler.log_anticipation(trial_count + 1, event.key, perf_counter_ns())
+
                 elif event.type == phase_change:
                     if actual_phase == 1: # Fixation Phase
+                        planned_onset_ns = phase_scheduler.deadline_ns
                         if not trial_block:
-                            send_trigger(trigger_helper["fixation"])
-                        screen.fill(background)
-                        screen.blit(fix, fixbox)
-                        pygame.display.update(fixbox)
-                        pygame.display.flip()
+                            trigger_dispatcher.send_now(trigger_helper["fixation"])
+                        show_frame_template("fixation", "fixation")
+                        phase_scheduler.log_onset(trial_count + 1, "fixation", planned_onset_ns, perf_counter_ns(), fixation_frames[trial_count])
                         #sleepy_trigger(1, trigger_latency)
-                        pygame.time.set_timer(phase_change, randint(1500 - trigger_gap, 2000 - trigger_gap), loops=1) # The trigger_gap (ms) range will be left for trigger launches in the following section.
+                        phase_scheduler.advance(frames_ms(fixation_frames[trial_count]) - trigger_gap)
                         actual_phase = 2
                     elif actual_phase == 2: # Target Card Presentation Phase
-                        # ms used on triggers
-                        triggers_load = 0
+                        if next_trial is None:
+                            done = True
+                            break
 
-                        image_count += 1
-                        if image_list[serie_count]["serie_size"] <= image_count:
-                            image_count = 0
-                            serie_count += 1
+                        trial = next_trial
+                        if trial['serie_count'] != serie_count:
                             corrects_in_series = 0
                             incorrects_in_series = 0
-                            if serie_count >= len(image_list):
-                                done = True
-                                break
-                            first_stimulus_trigger_sent = False
-                            
-                        elif image_list[serie_count]["serie_size"] - 1 == image_count:
-                            last_image = True
-
-                        # obtenemos los datos de la carta actual
-                        card_color = translate_helper[image_list[serie_count]["order"][image_count].parts[-1].split('.')[0].split('_')[2]]
-                        card_figure = translate_helper[image_list[serie_count]["order"][image_count].parts[-1].split('.')[0].split('_')[1]]
-                        card_number = image_list[serie_count]["order"][image_count].parts[-1].split('.')[0].split('_')[0]
-                        
-                        if not first_stimulus_trigger_sent:
-                            if not trial_block:
-                                sleepy_trigger(trigger_helper["first_stimulus_per_serie"], individual_trigger_gap)
-                                sleepy_trigger(trigger_helper[f"actual_rule_{series_types[serie_count]}"], individual_trigger_gap)
-                            
-                            triggers_load += 2*individual_trigger_gap
-
-                            first_stimulus_trigger_sent = True
-
-                        if last_feedback is not None:
-                            if not trial_block:
-                                sleepy_trigger(trigger_helper[last_feedback], individual_trigger_gap)
-                            triggers_load += individual_trigger_gap
-                            last_feedback = None
-
-                        if last_image:
-                            if not trial_block:
-                                sleepy_trigger(trigger_helper["last_target_card"], individual_trigger_gap)
-                            triggers_load += individual_trigger_gap
+                        serie_count, image_count = trial['serie_count'], trial['image_count']
+                        last_image = trial['last_image']
+
+                        trial_count += 1
+                        planned_onset_ns = phase_scheduler.deadline_ns + trigger_gap * 1_000_000
 
                         if not trial_block:
-                            sleepy_trigger(trigger_helper[f"{card_color}_card"], individual_trigger_gap)
-                            sleepy_trigger(trigger_helper[f"{card_figure}_card"], individual_trigger_gap)
-                            sleepy_trigger(trigger_helper[f"number_{card_number}_card"], individual_trigger_gap)
+                            trigger_dispatcher.post_sequence(trial['triggers'], trigger_burst_spacing_ms)
 
-                        triggers_load += 3*individual_trigger_gap
+                        discard_anticipations(phase_scheduler, trial_count)  # while the triggers are being sent
 
-                        pygame.time.delay(max(0, trigger_gap - triggers_load))  # Adjust wait time to maintain consistent latency
+                        overrun_ns = wait_for_onset(planned_onset_ns)
 
-                        show_image_trial(image_list[serie_count]["order"][image_count], 300, trial_block=trial_block)
+                        stimulus_onset, trigger_ns = show_image_trial(trial['frame'], trial_block=trial_block)
+                        phase_scheduler.log_onset(trial_count, "target", planned_onset_ns, stimulus_onset[0] if stimulus_onset is not None else perf_counter_ns(), trigger_ns=trigger_ns, overrun_ns=overrun_ns)
+
+                        # The response window opens at the flip: whatever is queued by now was pressed
+                        # before the stimulus, cleared after the onset trigger so it does not delay it
+                        discard_anticipations(phase_scheduler, trial_count)
                         #sleepy_trigger(trigger_helper["1"], trigger_latency)  # Exposure image trigger first
 
-                        answer = wait_answer(image_list[serie_count]["order"][image_count], series_types[serie_count])
+                        answer = wait_answer(trial['image'], trial['series_type'], stimulus_onset, trial['correct_row'])
 
                         if not trial_block:
-                            send_trigger(trigger_helper[f"answer_{answer['selected_answer'] + 1}"])  # Trigger according to selected answer
+                            trigger_dispatcher.send_now(trigger_helper[f"answer_{answer['selected_answer'] + 1}"])  # Trigger according to selected answer, sent at the response like the onset marker
+
+                        answers_list.append([trial['image'], answer, trial['series_type']])
 
-                        answers_list.append([image_list[serie_count]["order"][image_count], answer, series_types[serie_count]])
+                        show_frame_template("blank", "blank")
+                        blank_onset_ns = perf_counter_ns()
+                        # Planned at the response, the blank lasts its refreshes from its own flip
+                        phase_scheduler.log_onset(trial_count, "blank", answer['response_ns'], blank_onset_ns, blank_frames[trial_count - 1])
+                        phase_scheduler.anchor(blank_onset_ns, frames_ms(blank_frames[trial_count - 1]) - trigger_gap)
 
-                        screen.fill(background)
-                        pygame.display.flip()
-                        pygame.time.set_timer(phase_change, randint(800 - trigger_gap, 1000 - trigger_gap), loops=1) # The trigger_gap (ms) range will be left for trigger launches in the following section.
+                        # Lookahead: the next trial is prepared while the blank and the feedback are on screen
+                        next_position = next_trial_position(image_list, serie_count, image_count)
+                        next_trial = prepare_trial(image_list, series_types, *next_position) if next_position is not None else None
                         actual_phase = 3
                     elif actual_phase == 3: # Response Feedback Phase
 
-                        triggers_load = 0
+                        planned_onset_ns = phase_scheduler.deadline_ns + trigger_gap * 1_000_000
 
-                        # Trigger launch based on the response
+                        # Trigger launch based on the response, sent as one burst
+                        feedback_triggers = []
                         if answer['is_correct']:
-                            if not trial_block:
-                                sleepy_trigger(trigger_helper["correct_response"], individual_trigger_gap)
-                            triggers_load += individual_trigger_gap
+                            feedback_triggers.append(trigger_helper["correct_response"])
 
                             corrects_in_series += 1
 
-                            if not trial_block:
-                                if corrects_in_series == 1:
-                                    sleepy_trigger(trigger_helper["first_correct"], individual_trigger_gap)
-                                elif corrects_in_series == 2:
-                                    sleepy_trigger(trigger_helper["second_correct"], individual_trigger_gap)
-                                else:
-                                    sleepy_trigger(trigger_helper["other_correct"], individual_trigger_gap)
-                            
-                            triggers_load += individual_trigger_gap * 3
+                            if corrects_in_series == 1:
+                                feedback_triggers.append(trigger_helper["first_correct"])
+                            elif corrects_in_series == 2:
+                                feedback_triggers.append(trigger_helper["second_correct"])
+                            else:
+                                feedback_triggers.append(trigger_helper["other_correct"])
 
                             last_answer_correct = True
 
                         else:
-                            if not trial_block: 
-                                sleepy_trigger(trigger_helper["incorrect_response"], individual_trigger_gap)
-
-                            triggers_load += individual_trigger_gap
+                            feedback_triggers.append(trigger_helper["incorrect_response"])
 
                             incorrects_in_series += 1
 
-                            if not trial_block:
-                                if incorrects_in_series == 1:
-                                    sleepy_trigger(trigger_helper["first_error"], individual_trigger_gap)
-                                elif incorrects_in_series == 2:
-                                    sleepy_trigger(trigger_helper["second_error"], individual_trigger_gap)
-                                else:
-                                    sleepy_trigger(trigger_helper["other_error"], individual_trigger_gap)
-
-                            triggers_load += individual_trigger_gap
+                            if incorrects_in_series == 1:
+                                feedback_triggers.append(trigger_helper["first_error"])
+                            elif incorrects_in_series == 2:
+                                feedback_triggers.append(trigger_helper["second_error"])
+                            else:
+                                feedback_triggers.append(trigger_helper["other_error"])
 
                             if last_answer_correct is not None and not last_answer_correct:
-                                if not trial_block:
-                                    sleepy_trigger(trigger_helper["error_between_correct"], individual_trigger_gap)
-                                triggers_load += individual_trigger_gap
+                                feedback_triggers.append(trigger_helper["error_between_correct"])
 
                             last_answer_correct = False
 
+                        if not trial_block:
+                            trigger_dispatcher.post_sequence(feedback_triggers, trigger_burst_spacing_ms)
+
                         if not last_image:
                             last_feedback = "last_feedback_" + ("141" if answer['is_correct'] else "104") if (corrects_in_series == 1 or incorrects_in_series == 1) else ("last_feedback_" + ("161" if answer['is_correct'] else "106") if (corrects_in_series == 2 or incorrects_in_series == 2) else "last_feedback_" + ("181" if answer['is_correct'] else "108"))
                         else:
                             last_image = False
-                        
-                        pygame.time.delay(max(0, trigger_gap - triggers_load))  # Adjust wait time to maintain consistent latency
-                        
-                        screen.fill(background)
-                        
-                        if answer['is_correct']:
-                            draw_check((0, 200, 0), center, 120)
-                        else:
-                            draw_cross((200, 0, 0), center, 120)
 
-                        pygame.display.flip()
+                        overrun_ns = wait_for_onset(planned_onset_ns)
+
+                        show_frame_template("correct" if answer['is_correct'] else "incorrect", "feedback")
+                        flip_ns = perf_counter_ns()
 
+                        trigger_ns = None
                         if not trial_block:
-                            sleepy_trigger(trigger_helper["feedback_trigger"], individual_trigger_gap)  # Feedback trigger after all other triggers to maintain consistent timing of feedback presentation in relation to triggers
+                            trigger_ns = trigger_dispatcher.send_now(trigger_helper["feedback_trigger"])  # Feedback trigger right after the flip, after all other triggers to maintain consistent timing of feedback presentation in relation to triggers
+
+                        phase_scheduler.log_onset(trial_count, "feedback", planned_onset_ns, flip_ns, feedback_frames, trigger_ns, overrun_ns)
+
+                        # the trigger bytes of the next trial depend on this feedback
+                        if next_trial is not None:
+                            next_trial['triggers'] = trial_triggers(next_trial, last_feedback)
+                        last_feedback = None
 
-                        pygame.time.set_timer(phase_change, 1500 - individual_trigger_gap, loops=1)
+                        phase_scheduler.advance(trigger_gap + frames_ms(feedback_frames))
                         actual_phase = 1
-                    
-    pygame.time.set_timer(phase_change, 0)
-    
+
     pygame.event.clear()                    # CLEAR EVENTS
 
     # acá se almacenará la answers_list en el archivo dfile
     if dfile is not None:
         for answer in answers_list:
-            # ("Sujeto", "IdImagen", "Bloque", "TReaccion", "TipoSerie", "Respuesta", "Acierto")
-            dfile.write("%s,%s,%s,%s,%s,%s,%s\n" % (uid,
-                                                    (Path(answer[0]).relative_to(BASE_DIR)).parts[-1].split('.')[0],
+            # ("Sujeto", "IdImagen", "Bloque", "TReaccion", "TipoSerie", "Respuesta", "Acierto", "DuracionTecla", "TReaccionHR")
+            dfile.write("%s,%s,%s,%s,%s,%s,%s,%s,%s\n" % (uid,
+                                                    card_registry[answer[0]].name,
                                                     block,
                                                     answer[1]['rt'],
                                                     answer[1]['series_type'],
                                                     answer[1]['selected_answer'],
-                                                    int(answer[1]['is_correct']) if answer[1]['is_correct'] is not None else ""
+                                                    int(answer[1]['is_correct']) if answer[1]['is_correct'] is not None else "",
+                                                    answer[1]['key_duration'] if answer[1]['key_duration'] is not None else "",
+                                                    f"{answer[1]['rt_hr']:.3f}"
                                                  ))
             
         dfile.flush()
     else:
         print("Error al cargar el archivo de datos")
 
+    # planned and achieved onset of every phase of every trial
+    if tfile is not None:
+        for onset in phase_scheduler.rows():
+            # ("Sujeto", "Bloque", "Ensayo", "Fase", "OnsetPlanificado", "OnsetLogrado", "Desfase", "FramesSolicitados", "FramesLogrados", "DesfaseTrigger", "SobrecargaTrigger", "Tecla")
+            tfile.write("%s,%s,%s,%s,%s,%.3f,%s,%s,%s,%s,%s,%s\n" % (uid,
+                                                             block,
+                                                             onset['trial'],
+                                                             onset['phase'],
+                                                             f"{onset['planned_ms']:.3f}" if onset['planned_ms'] is not None else "",
+                                                             onset['achieved_ms'],
+                                                             f"{onset['offset_ms']:.3f}" if onset['offset_ms'] is not None else "",
+                                                             onset['requested_frames'] if onset['requested_frames'] is not None else "",
+                                                             onset['achieved_frames'] if onset['achieved_frames'] is not None else "",
+                                                             f"{onset['trigger_offset_ms']:.3f}" if onset['trigger_offset_ms'] is not None else "",
+                                                             f"{onset['overrun_ms']:.3f}" if onset['overrun_ms'] is not None else "",
+                                                             onset['key'] if onset['key'] is not None else ""))
+        tfile.flush()
+
     if not trial_block:
-        send_trigger(trigger_helper[f"block_{block}_end"])
+        trigger_dispatcher.post(trigger_helper[f"block_{block}_end"])
+
+        session_metadata["display_updates"] = display_presenter.summary()
+        session_metadata["event_waiting"] = event_waiter.summary()
+        session_metadata["precise_delay"] = delay_overshoot_summary()
+        session_metadata["triggers"] = trigger_dispatcher.summary()
+        session_metadata.setdefault("phase_schedule", {})[f"block_{block}"] = phase_scheduler.summary()
+        session_metadata.setdefault("gc_pauses", {})[f"block_{block}"] = gc_pause_summary(phase_scheduler.block_start_ns, perf_counter_ns())
+        write_session_metadata()
+        print(f"[DEBUG] Display update cost: {session_metadata['display_updates']}") if debug else None
+        print(f"[DEBUG] Event waiting: {session_metadata['event_waiting']}") if debug else None
+        print(f"[DEBUG] Precise delay overshoot: {session_metadata['precise_delay']}") if debug else None
+        print(f"[DEBUG] Triggers: {session_metadata['triggers']}") if debug else None
+        print(f"[DEBUG] Phase onsets: {session_metadata['phase_schedule'][f'block_{block}']}") if debug else None
+        print(f"[DEBUG] GC pauses: {session_metadata['gc_pauses'][f'block_{block}']}") if debug else None
 
 # ==============================
 # Block / Series Generation
@@ -1230,20 +2935,35 @@ def create_debug_zip(debug_base_dir, zip_name):
     if debug:
         print(f"[DEBUG] Debug ZIP created at: {zip_path}")
 
+# ==============================
+# Session Metadata
+# ==============================
+
+def write_session_metadata():
+    """Writes the session metadata as JSON next to the data file."""
+    if session_metadata_path is None:
+        return
+
+    with open(session_metadata_path, "w", encoding="utf-8") as f:
+        json.dump(session_metadata, f, indent=4, ensure_ascii=False, default=str)
+
 # ==============================
 # Main
 # ==============================
 
 def main():
 
+    # Garbage collections are timed in every session, to show whether any hit a block
+    gc.callbacks.append(record_gc_pause)
+
     init_com(address=serial_port)
 
     # Si no existe la carpeta data se crea
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
-    # if not media folders exist, exit
-    if not single_cards_dir.exists() or not double_cards_dir.exists():
+    # if not media folders exist, exit (generated vector cards do not need them)
+    if card_source == "images" and (not single_cards_dir.exists() or not double_cards_dir.exists()):
         print("Media folders not found. Please ensure the 'media/images/Single' and 'media/images/Double' directories exist.")
         return
 
@@ -1275,11 +2995,35 @@ def main():
 
     csv_name = subj_name + ("_pre" if condition_input == 1 else "post") + '_Wisconsin_' + date_name + '.csv'
     dfile = open(DATA_DIR/csv_name, 'w')
-    dfile.write("%s,%s,%s,%s,%s,%s,%s\n" % ("Sujeto", "IdImagen", "Bloque", "TReaccion", "TipoSerie", "Respuesta", "Acierto"))
+
+    global session_metadata_path
+    session_metadata_path = DATA_DIR / csv_name.replace('.csv', '_metadata.json')
+    session_metadata["subject"] = subj_name
+    session_metadata["condition"] = condition_input
+
+    # Scoring table for rescoring this session in bulk
+    scoring_path = DATA_DIR / csv_name.replace('.csv', '_scoring.npz')
+    export_correctness_matrix(scoring_path)
+    session_metadata["scoring_matrix"] = scoring_path.name
+    dfile.write("%s,%s,%s,%s,%s,%s,%s,%s,%s\n" % ("Sujeto", "IdImagen", "Bloque", "TReaccion", "TipoSerie", "Respuesta", "Acierto", "DuracionTecla", "TReaccionHR"))
     dfile.flush()
 
+    # Planned vs achieved phase onsets of every trial
+    tfile = open(DATA_DIR/csv_name.replace('.csv', '_timing.csv'), 'w')
+    tfile.write("%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s\n" % ("Sujeto", "Bloque", "Ensayo", "Fase", "OnsetPlanificado", "OnsetLogrado", "Desfase", "FramesSolicitados", "FramesLogrados", "DesfaseTrigger", "SobrecargaTrigger", "Tecla"))
+    tfile.flush()
+
+    # Send time of every trigger, written by the trigger dispatcher
+    trigger_dispatcher.log_file = open(DATA_DIR/csv_name.replace('.csv', '_triggers.csv'), 'w')
+    trigger_dispatcher.log_file.write("%s,%s,%s,%s,%s\n" % ("Bloque", "Codigo", "EnvioPlanificado", "Envio", "Desfase"))
+    trigger_dispatcher.log_file.flush()
+
     init()
 
+    # After init(), so the dispatcher thread and the card decoding workers are not confined to the render core
+    if realtime_mode:
+        session_metadata["realtime"] = enter_realtime_mode(realtime_cpu, [trigger_dispatcher])
+
     # Block series stacks generation and debug files
     block_stacks = block_creation()
 
@@ -1287,16 +3031,24 @@ def main():
     paragraph(select_slide('pretrial'), key = K_SPACE, no_foot = False)
 
     trial_block_series, trial_types = trial_block_creation()
+    if realtime_mode:
+        hold_gc()
     show_images(trial_block_series, uid=subj_name, dfile=None, block=0, series_types=[serie["serie_type"] for serie in trial_block_series], trial_block=True)
+    if realtime_mode:
+        release_gc()
 
     paragraph(select_slide('posttrial', variables={"blockNumber": 0, "practice": True, "trial_types": trial_types}), key = K_SPACE, no_foot = False)
 
-    send_trigger(trigger_helper["start_experiment"])
+    trigger_dispatcher.post(trigger_helper["start_experiment"])
 
     for block_number, block in enumerate(block_stacks):
         series_types = generate_series_types_for_block()
+        if realtime_mode:
+            hold_gc()  # no collection can pause a trial, the garbage is collected at the break
         show_images(block, uid=subj_name, dfile=dfile
-                    , block=block_number + 1, series_types=series_types)
+                    , block=block_number + 1, series_types=series_types, tfile=tfile)
+        if realtime_mode:
+            release_gc()
 
         # if not the last block, show break screen
         if block_number < len(block_stacks) - 1:
@@ -1310,4 +3062,8 @@ def main():
     ends()
 
 if __name__ == "__main__":
-    main()
+    if "--benchmark-triggers" in sys.argv:
+        # trigger throughput and latency of the configured backend, no experiment is run
+        print(json.dumps(benchmark_trigger_backend(open_trigger_backend(trigger_backend, serial_port)), indent=4))
+    else:
+        main()